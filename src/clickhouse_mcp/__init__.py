@@ -2,10 +2,6 @@
 
 __version__ = "0.1.0"
 
-import importlib
-
-importlib.import_module("http.client")
-
 # Default Bedrock model ID and region for embeddings
 DEFAULT_BEDROCK_MODEL = "amazon.titan-embed-text-v2:0"
 DEFAULT_REGION = "us-east-1"
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 """PyTorch HUD MCP server entry point."""
 
-from clickhouse_mcp.mcp_server import mcp
+from clickhouse_mcp.mcp_server import mcp, warm_vector_store
 
 
 def main() -> None:
     """Launch the MCP server using Streamable HTTP."""
     print("Starting PyTorch ClickHouse MCP server...")
+    warm_vector_store()
     mcp.run(transport="sse", host="0.0.0.0")
 
 
@@ -1,15 +1,20 @@
 """ClickHouse documentation search utilities."""
 
-import pickle
+import heapq
 import random
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 
 
+@lru_cache(maxsize=1)
 def get_package_root() -> Path:
     """Get the package root directory (where the module is installed)."""
+    # Constant for the life of the process, so resolve (and its stat calls) only once
     return Path(__file__).resolve().parent
 
+@lru_cache(maxsize=1)
 def get_project_root() -> Path:
     """Get the project root directory."""
     # This function is kept for backward compatibility
@@ -30,6 +35,10 @@ def get_default_pickle_path() -> Path:
 def load_chunks(pickle_path: Optional[Union[str, Path]] = None) -> List[Dict[str, Any]]:
     """Load document chunks from a pickle file.
     
+    Each chunk also gets lowercased copies of its content and string metadata
+    values (`_content_lower`, `_metadata_lower`) so searches don't have to
+    lowercase the whole corpus on every query.
+    
     Args:
         pickle_path: Path to the pickle file. If None, uses the default path.
         
@@ -39,8 +48,24 @@ def load_chunks(pickle_path: Optional[Union[str, Path]] = None) -> List[Dict[str
     if pickle_path is None:
         pickle_path = get_default_pickle_path()
 
+    import pickle
+
     with open(pickle_path, 'rb') as f:
-        return pickle.load(f)
+        chunks = pickle.load(f)
+
+    for chunk in chunks:
+        _add_search_cache(chunk)
+    return chunks
+
+
+def _add_search_cache(chunk: Dict[str, Any]) -> None:
+    """Precompute the lowercased fields used by simple_search for a chunk.
+    
+    Args:
+        chunk: Document chunk to annotate in place.
+    """
+    chunk['_content_lower'] = chunk['content'].lower()
+    chunk['_metadata_lower'] = [v.lower() for v in chunk['metadata'].values() if isinstance(v, str)]
 
 
 def simple_search(chunks: List[Dict[str, Any]], query: str, num_results: int = 5) -> List[Dict[str, Any]]:
@@ -55,39 +80,54 @@ def simple_search(chunks: List[Dict[str, Any]], query: str, num_results: int = 5
         List of document chunks matching the query, sorted by relevance.
     """
     query = query.lower()
+    # Only words longer than two characters contribute to the score;
+    # filter them once instead of once per chunk
+    query_words = [word for word in query.split() if len(word) > 2]
+    # A query that is exactly one scored word matches as a phrase whenever it is counted
+    single_word = query_words == [query]
+    
     # Score each chunk based on the query (simple word matching)
     scored_chunks = []
     for chunk in chunks:
-        content = chunk['content'].lower()
+        # Use the lowercased copies cached by load_chunks when available
+        content = chunk.get('_content_lower')
+        if content is None:
+            content = chunk['content'].lower()
+        metadata_values = chunk.get('_metadata_lower')
+        if metadata_values is None:
+            metadata_values = [v.lower() for v in chunk['metadata'].values() if isinstance(v, str)]
         score = 0
         
-        # Check for exact phrase match
-        if query in content:
-            score += 10
-        
         # Count individual words
-        query_words = query.split()
+        words_found = True
         for word in query_words:
-            if len(word) > 2:  # Skip very short words
-                score += content.count(word)
+            count = content.count(word)
+            if count:
+                score += count
+            else:
+                words_found = False
+        
+        # Check for exact phrase match; the phrase contains every query word,
+        # so it can only match if all of them were found
+        if words_found and (single_word or query in content):
+            score += 10
         
         # Also check metadata
-        for k, v in chunk['metadata'].items():
-            if isinstance(v, str) and query in v.lower():
+        for v in metadata_values:
+            if query in v:
                 score += 5
-            elif isinstance(v, str):
+            else:
                 for word in query_words:
-                    if len(word) > 2 and word in v.lower():
+                    if word in v:
                         score += 1
         
         if score > 0:
             scored_chunks.append((score, chunk))
     
-    # Sort by score (descending)
-    scored_chunks.sort(key=lambda x: x[0], reverse=True)
-    
-    # Return top results
-    return [chunk for _, chunk in scored_chunks[:num_results]]
+    # Select the top results by score (descending) without sorting every match;
+    # nlargest keeps the same order as a stable sort for equal scores
+    top_chunks = heapq.nlargest(num_results, scored_chunks, key=itemgetter(0))
+    return [chunk for _, chunk in top_chunks]
 
 
 def get_context_snippet(content: str, query: str, context_size: int = 50) -> str:
@@ -1,50 +1,117 @@
-import clickhouse_connect.driver.ctypes
-import clickhouse_connect.driver.types
-import clickhouse_connect.driverc
 from . import DEFAULT_BEDROCK_MODEL, DEFAULT_REGION
-from .vector_search import load_faiss_index, vector_search, get_default_index_path
-from langchain_community.vectorstores import FAISS
-from langchain_aws import BedrockEmbeddings
 import clickhouse_connect
 import json
+import contextlib
+import hashlib
+from functools import lru_cache
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 import datetime
-from typing import Optional, Any, Dict
-import clickhouse_connect.common
-import clickhouse_connect.driver
-import clickhouse_connect.driver.client
+import decimal
+import logging
+import orjson
+from typing import TYPE_CHECKING, Optional, Any, Dict, Hashable, Tuple
 import clickhouse_connect.driver.exceptions
-import clickhouse_connect.driver.query
+import clickhouse_connect.driver.httputil
 from fastmcp import FastMCP
 import os
+import threading
 import time
 import requests
-import sqlfluff
-import tempfile
 
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env file
 
-# Import required modules for vector search
+# Vector search (langchain, Bedrock) and sqlfluff are slow to import, so they
+# are imported inside the tools that need them to keep server startup fast
+if TYPE_CHECKING:
+    import clickhouse_connect.driver.client
+    import clickhouse_connect.driver.query
+    from langchain_community.vectorstores import FAISS
 
+logger = logging.getLogger(__name__)
 
 # Create an MCP server
 mcp = FastMCP("PyTorch ClickHouse MCP")
 
-clickhouse_client: Optional[clickhouse_connect.driver.client.Client] = None
+# A client must not run concurrent queries, so each thread gets its own client.
+# All clients share one urllib3 pool manager so HTTP connections are reused;
+# its size comes from CLICKHOUSE_POOL_SIZE (default: number of CPUs).
+_client_local = threading.local()
+_pool_manager = None
+_pool_manager_lock = threading.Lock()
+
+# Keep-alive HTTP session for fetching query definitions from GitHub, plus a
+# cache of the downloaded files: they only change when a PR is merged, so they
+# are reused for a while and then revalidated with their ETag
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+GITHUB_CACHE_TTL = 300  # seconds
+_github_cache: Dict[str, Tuple[float, Optional[str], str]] = {}
+_github_cache_lock = threading.Lock()
 
 # Maximum response size in bytes - set to a conservative size for context window efficiency
 MAX_RESPONSE_SIZE = 10 * 1024  # 10KB
 
-# datetime serializer for JSON
+# With tmp files disabled, results are capped server-side at this multiple of
+# the inline byte limit (ClickHouse counts uncompressed block bytes, which can
+# be much smaller than the row JSON, hence the generous factor)
+INLINE_ONLY_RESULT_BYTES_FACTOR = 64
 
+# How long to poll query_log for a query's performance data. Without the
+# SYSTEM FLUSH LOGS grant the entry only shows up on the server's flush
+# interval (7.5s by default), so the wait is kept just past that
+PERFORMANCE_WAIT_SECONDS = 60
+PERFORMANCE_WAIT_NO_FLUSH_SECONDS = 8
 
-def datetime_serializer(obj):
-    if isinstance(obj, datetime.datetime):
+# Schemas and table lists rarely change, so their lookups are cached briefly
+METADATA_CACHE_TTL = 300  # seconds
+METADATA_CACHE_MAXSIZE = 256
+_metadata_cache: Dict[Hashable, Tuple[float, str]] = {}
+_metadata_cache_lock = threading.Lock()
+
+# datetime serializer for JSON. orjson handles dates and datetimes natively, so
+# it only calls this for Decimal (ClickHouse Decimal columns); the stdlib json
+# fallbacks use it for all three. Decimals become strings to keep their precision
+
+
+def datetime_serializer(obj, _date=datetime.date, _decimal=decimal.Decimal):
+    # datetime.datetime is a subclass of datetime.date
+    if isinstance(obj, _date):
         return obj.isoformat()
+    if isinstance(obj, _decimal):
+        return str(obj)
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
-def clickhouse_response_to_json(res: clickhouse_connect.driver.query.QueryResult) -> str:
+def dumps_json_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Serialize data to UTF-8 JSON bytes using orjson.
+
+    orjson serializes datetimes natively. Values it rejects (e.g. integers
+    wider than 64 bits, as returned for UInt128/Int256 columns) fall back
+    to the standard library encoder, which also keeps non-ASCII text as
+    UTF-8.
+
+    Args:
+        obj: The data to serialize
+        indent: Whether to pretty print with 2-space indentation
+
+    Returns:
+        bytes: The JSON encoded data
+    """
+    try:
+        return orjson.dumps(
+            obj,
+            default=datetime_serializer,
+            option=orjson.OPT_INDENT_2 if indent else 0
+        )
+    except orjson.JSONEncodeError:
+        return json.dumps(
+            obj, indent=2 if indent else None, ensure_ascii=False, default=datetime_serializer
+        ).encode('utf-8')
+
+
+def clickhouse_response_to_json(res: "clickhouse_connect.driver.query.QueryResult") -> str:
     """Convert ClickHouse query result to JSON string.
 
     Args:
@@ -69,13 +136,119 @@ def get_clean_error_string(clickhouse_error_msg: str) -> str:
         str: The cleaned error message
     """
     # Remove unnecessary details from the error message - everything before "received ClickHouse error"
-    if "received ClickHouse error" not in clickhouse_error_msg:
+    _, marker, details = clickhouse_error_msg.rpartition("received ClickHouse error")
+    if not marker:
         return clickhouse_error_msg
-    return "Clickhouse error " + clickhouse_error_msg.split("received ClickHouse error")[-1].strip()
+    return "Clickhouse error " + details.strip()
 
 
-def get_clickhouse_client() -> clickhouse_connect.driver.client.Client:
-    """Get the ClickHouse client instance.
+def get_pool_size() -> int:
+    """Get the number of pooled connections to keep per ClickHouse host.
+
+    Returns:
+        int: The value of CLICKHOUSE_POOL_SIZE, or the number of CPUs if unset
+
+    Raises:
+        ValueError: If CLICKHOUSE_POOL_SIZE is not a positive integer
+    """
+    pool_size = os.getenv("CLICKHOUSE_POOL_SIZE")
+    if not pool_size:
+        return os.cpu_count() or 1
+
+    try:
+        size = int(pool_size)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise ValueError(
+            f"CLICKHOUSE_POOL_SIZE must be a positive integer, got '{pool_size}'")
+    return size
+
+
+def get_pool_manager():
+    """Get the HTTP connection pool shared by all ClickHouse clients.
+
+    Returns:
+        urllib3.PoolManager: The shared pool manager
+
+    Raises:
+        ValueError: If CLICKHOUSE_POOL_SIZE is invalid
+    """
+    global _pool_manager
+    with _pool_manager_lock:
+        if _pool_manager is None:
+            _pool_manager = clickhouse_connect.driver.httputil.get_pool_manager(
+                maxsize=get_pool_size())
+        return _pool_manager
+
+
+def get_http_session() -> requests.Session:
+    """Get the HTTP session shared by all GitHub downloads.
+
+    Returns:
+        requests.Session: The shared session, reusing connections across calls
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+        return _http_session
+
+
+def fetch_github_text(url: str) -> str:
+    """Download a text file from GitHub, using the local cache when possible.
+
+    Fresh cache entries are returned without a request. Stale entries are
+    revalidated with If-None-Match, so an unchanged file costs a 304 with
+    no body. If revalidation fails (e.g. rate limiting or a server error),
+    the cached copy is returned.
+
+    Args:
+        url: The URL of the file
+
+    Returns:
+        str: The file content
+
+    Raises:
+        requests.HTTPError: If the download fails and nothing is cached
+    """
+    with _github_cache_lock:
+        entry = _github_cache.get(url)
+    if entry is not None and time.monotonic() - entry[0] < GITHUB_CACHE_TTL:
+        return entry[2]
+
+    headers = {}
+    if entry is not None and entry[1]:
+        headers["If-None-Match"] = entry[1]
+    response = get_http_session().get(url, headers=headers)
+
+    if entry is not None and response.status_code == 304:
+        text = entry[2]
+        etag = entry[1]
+    elif response.status_code == 200:
+        text = response.text
+        etag = response.headers.get("ETag")
+    else:
+        # Don't cache failures, and never return an error page as the file
+        if entry is not None:
+            return entry[2]
+        response.raise_for_status()
+        raise requests.HTTPError(
+            f"Unexpected HTTP status {response.status_code} for url: {url}", response=response)
+
+    with _github_cache_lock:
+        _github_cache[url] = (time.monotonic(), etag, text)
+    return text
+
+
+def clear_github_cache() -> None:
+    """Drop all cached GitHub downloads."""
+    with _github_cache_lock:
+        _github_cache.clear()
+
+
+def get_clickhouse_client() -> "clickhouse_connect.driver.client.Client":
+    """Get the ClickHouse client instance for the current thread.
 
     Returns:
         clickhouse_connect.Client: The ClickHouse client.
@@ -84,8 +257,8 @@ def get_clickhouse_client() -> clickhouse_connect.driver.client.Client:
         ValueError: If any required environment variables are missing
         Exception: If connection to ClickHouse fails
     """
-    global clickhouse_client
-    if clickhouse_client is None:
+    client = getattr(_client_local, "client", None)
+    if client is None:
         # Check for required environment variables
         host = os.getenv("CLICKHOUSE_HOST")
         port = os.getenv("CLICKHOUSE_PORT")
@@ -105,15 +278,84 @@ def get_clickhouse_client() -> clickhouse_connect.driver.client.Client:
             raise ValueError(
                 f"Missing required environment variables: {', '.join(missing)}")
 
-        clickhouse_client = clickhouse_connect.get_client(
+        client = clickhouse_connect.get_client(
             host=host,
             port=port,
             username=username,
             password=password,
             database="default",
-            secure=True
+            secure=True,
+            pool_mgr=get_pool_manager()
         )
-    return clickhouse_client
+        _client_local.client = client
+    return client
+
+
+def get_cached_metadata(key: Hashable) -> Optional[str]:
+    """Get a cached metadata lookup result if it has not expired.
+
+    Args:
+        key: The cache key of the lookup
+
+    Returns:
+        The cached result, or None if missing or expired
+    """
+    with _metadata_cache_lock:
+        entry = _metadata_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= METADATA_CACHE_TTL:
+            del _metadata_cache[key]
+            return None
+        return entry[1]
+
+
+def set_cached_metadata(key: Hashable, value: str) -> None:
+    """Cache a successful metadata lookup result.
+
+    Args:
+        key: The cache key of the lookup
+        value: The result to cache
+    """
+    with _metadata_cache_lock:
+        _metadata_cache.pop(key, None)
+        if len(_metadata_cache) >= METADATA_CACHE_MAXSIZE:
+            # Evict the oldest entry
+            del _metadata_cache[next(iter(_metadata_cache))]
+        _metadata_cache[key] = (time.monotonic(), value)
+
+
+def clear_metadata_cache() -> None:
+    """Drop all cached schema and table lookups."""
+    with _metadata_cache_lock:
+        _metadata_cache.clear()
+
+
+def min_row_json_size(row: Any) -> int:
+    """Cheaply compute a lower bound for the compact JSON size of a result row.
+
+    Strings count their characters plus quotes, arrays at least one character
+    per element plus separators, and any other value one character; the real
+    encoding is never smaller.
+
+    Args:
+        row: A result row, usually a tuple of cell values
+
+    Returns:
+        int: The minimum number of bytes the encoded row takes
+    """
+    if not isinstance(row, (list, tuple)):
+        return 1
+
+    size = 2 + max(len(row) - 1, 0)  # brackets and commas
+    for cell in row:
+        if isinstance(cell, str):
+            size += len(cell) + 2
+        elif isinstance(cell, (list, tuple)):
+            size += 2 * len(cell) + 1 if cell else 2
+        else:
+            size += 1
+    return size
 
 
 def safe_json_dumps(data: Any, indent: int = 2, max_size: int = MAX_RESPONSE_SIZE) -> str:
@@ -124,15 +366,26 @@ def safe_json_dumps(data: Any, indent: int = 2, max_size: int = MAX_RESPONSE_SIZ
         indent: Indentation level for pretty printing
         max_size: Maximum response size in bytes
 
+    Data is encoded with orjson (see dumps_json_bytes), so datetimes are
+    serialized as ISO strings. Lists that are too large are cut after the
+    last item that still fits, so the JSON before the warning stays valid;
+    other data, and lists whose first item alone is too large, are cut at
+    the size limit.
+
     Returns:
         JSON string, truncated if needed with a warning message
     """
-    # Always use indentation for readability
-    json_str = json.dumps(data, indent=indent)
+    # orjson only indents by two spaces, which is what all callers use
+    if indent == 2:
+        json_bytes = dumps_json_bytes(data, indent=True)
+    else:
+        json_bytes = json.dumps(
+            data, indent=indent, ensure_ascii=False, default=datetime_serializer
+        ).encode('utf-8')
 
     # Return as-is if under the size limit
-    if len(json_str) <= max_size:
-        return json_str
+    if len(json_bytes) <= max_size:
+        return json_bytes.decode('utf-8')
 
     # Hard truncate with a clear error message
     warning_msg = (
@@ -145,16 +398,32 @@ def safe_json_dumps(data: Any, indent: int = 2, max_size: int = MAX_RESPONSE_SIZ
     if trunc_size < 200:  # Ensure we have some minimal content
         trunc_size = 200
 
-    # Return truncated JSON with error message
-    return json_str[:trunc_size] + warning_msg
+    if len(json_bytes) <= trunc_size:
+        return json_bytes.decode('utf-8') + warning_msg
+
+    if isinstance(data, (list, tuple)) and indent:
+        # JSON strings never contain a raw newline, so in the indented output
+        # each top-level item starts on a line indented exactly once; keep
+        # the items before the last such start that still leaves room to
+        # close the list
+        separator = b",\n" + b" " * indent
+        closing = b"\n]"
+        end = trunc_size - len(closing) + len(separator)
+        while True:
+            cut = json_bytes.rfind(separator, 0, end)
+            if cut == -1:
+                break
+            if json_bytes[cut + len(separator):cut + len(separator) + 1] != b" ":
+                return (json_bytes[:cut] + closing).decode('utf-8') + warning_msg
+            # A separator inside a nested item; look further back
+            end = cut + len(separator) - 1
+
+    # Return truncated JSON with error message, dropping any partial character
+    return json_bytes[:trunc_size].decode('utf-8', 'ignore') + warning_msg
 
 
-@mcp.tool()
-def readme_howto_use_clickhouse_tools() -> str:
-    """Returns a guide on how to use the ClickHouse tools.
-    """
-    return (
-        """
+# Static usage guide returned by readme_howto_use_clickhouse_tools
+_README_TEXT = """
         Clickhouse is a column based database used in PyTorch CI.
         It is used to store and query test results and other data.
 
@@ -173,7 +442,14 @@ def readme_howto_use_clickhouse_tools() -> str:
 
 
         Use this to create and run queries if user asks things like: 'what's the slowest query? How can I query X in ClickHouse?'
-        """)
+        """
+
+
+@mcp.tool()
+def readme_howto_use_clickhouse_tools() -> str:
+    """Returns a guide on how to use the ClickHouse tools.
+    """
+    return _README_TEXT
 
 
 
@@ -189,10 +465,11 @@ def run_clickhouse_query(query: str, inline_result_limit_bytes: int = 1024, meas
     Returns:
         result['time']: The time taken to execute the query
         result['result_rows']: Array of result rows that fit within the byte limit (at least one row is always returned)
-        result['total_result_rows_n']: Total number of rows returned by the query
+        result['total_result_rows_n']: Total number of rows returned by the query (with tmp files disabled, the
+            server stops sending rows once far past the inline limit, so this is then a lower bound for large results)
         result['columns']: The number of columns returned by the query
         result['error']: An error message if the query failed
-        result['hash']: The hash of the query result
+        result['hash']: (Optional, with result_file) The SHA-256 hex digest of the result file contents
         result['performance']: (Optional) Detailed performance metrics if measure_performance is True
         result['result_file']: (Optional, if enabled) A file containing the result of the query as a JSON string
 
@@ -231,57 +508,100 @@ def run_clickhouse_query(query: str, inline_result_limit_bytes: int = 1024, meas
             settings = "settings enable_filesystem_cache = 0, use_query_cache = false"
             query += f" {settings}"
 
-        res: Optional[clickhouse_connect.driver.query.QueryResult] = client.query(
-            query)
-        end_time = time.time()  # End timing the query execution
-
-        column_names = res.column_names
-        # dump to json, with converting datetime to string
-        json_result = json.dumps(
-            res.result_rows, indent=2, default=datetime_serializer)
-
         # Check if tmp file generation is disabled
         disable_tmp_files = os.getenv(
             "CLICKHOUSE_DISABLE_TMP_FILES", "false").lower() == "true"
         filename = None
 
+        if disable_tmp_files and not measure_performance:
+            # Only the inline rows are returned, so let the server stop sending
+            # data once well past what can be inlined
+            res: Optional["clickhouse_connect.driver.query.QueryResult"] = client.query(
+                query, settings={
+                    "max_result_bytes": inline_result_limit_bytes * INLINE_ONLY_RESULT_BYTES_FACTOR,
+                    "result_overflow_mode": "break",
+                })
+        else:
+            res = client.query(query)
+        end_time = time.time()  # End timing the query execution
+
+        column_names = res.column_names
+        result_rows = res.result_rows
+
         if not disable_tmp_files:
             # Save to a temporary file - generate the filename to be unique
             filename = f"/tmp/clickhouse_query_result_{res.query_id}.json"
 
-            try:
-                with open(filename, "w") as f:
-                    f.write(json_result)  # Write the JSON result to the file
-            except IOError as e:
-                return {
-                    "time": end_time - start_time,
-                    "columns": column_names,
-                    "error": f"File system error: Failed to write result to file: {str(e)}",
-                }
-
-        json_data = json.loads(json_result)
-
-        # Limit result rows by byte size
+        # Each row is encoded once: it is streamed to the result file (one row
+        # per line), hashed as it is written and, while within the byte limit,
+        # also returned inline
+        digest = hashlib.sha256()
         limited_rows = []
         current_size = 0
         size_limit_exceeded = False
+        file_opened = False
 
-        for row in json_data:
-            row_json = json.dumps(row, default=datetime_serializer)
-            row_size = len(row_json.encode('utf-8'))
+        try:
+            with open(filename, "wb") if filename is not None else contextlib.nullcontext() as f:
+                file_opened = f is not None
+
+                def write(chunk: bytes) -> None:
+                    f.write(chunk)
+                    digest.update(chunk)
+
+                if f is not None:
+                    write(b"[")
+
+                for i, row in enumerate(result_rows):
+                    if f is None and limited_rows and \
+                            current_size + min_row_json_size(row) > inline_result_limit_bytes:
+                        # The row can't fit, and without a result file it
+                        # doesn't need to be encoded at all
+                        size_limit_exceeded = True
+                        break
 
-            if not limited_rows or current_size + row_size <= inline_result_limit_bytes:
-                limited_rows.append(row)
-                current_size += row_size
-            else:
-                size_limit_exceeded = True
-                break
+                    # Convert to JSON, with converting datetime to string
+                    row_json = dumps_json_bytes(row)
+
+                    if f is not None:
+                        write(b",\n  " if i else b"\n  ")
+                        write(row_json)
+
+                    if size_limit_exceeded:
+                        continue
+
+                    row_size = len(row_json)
+                    if not limited_rows or current_size + row_size <= inline_result_limit_bytes:
+                        # json.loads keeps integers wider than 64 bits exact,
+                        # orjson.loads would turn them into floats
+                        limited_rows.append(json.loads(row_json))
+                        current_size += row_size
+                    else:
+                        size_limit_exceeded = True
+                        if f is None:
+                            # Nothing else needs the remaining rows
+                            break
+
+                if f is not None:
+                    write(b"\n]" if limited_rows else b"]")
+        except Exception as e:
+            # Don't leave a truncated result file behind
+            if file_opened:
+                with contextlib.suppress(OSError):
+                    os.remove(filename)
+            if not isinstance(e, IOError):
+                raise
+            return {
+                "time": end_time - start_time,
+                "columns": column_names,
+                "error": f"File system error: Failed to write result to file: {str(e)}",
+            }
 
         # Build the base result
         result = {
             "time": end_time - start_time,
             "result_rows": limited_rows,
-            "total_result_rows_n": len(json_data),
+            "total_result_rows_n": len(result_rows),
             "columns": column_names,
             "query_id": res.query_id,
         }
@@ -289,6 +609,7 @@ def run_clickhouse_query(query: str, inline_result_limit_bytes: int = 1024, meas
         # Only include result_file if tmp file was created
         if filename is not None:
             result["result_file"] = filename
+            result["hash"] = digest.hexdigest()
 
         if size_limit_exceeded:
             result["warning"] = (
@@ -298,12 +619,28 @@ def run_clickhouse_query(query: str, inline_result_limit_bytes: int = 1024, meas
 
         # If performance measurement is enabled, fetch the query log data
         if measure_performance:
+            # Ask the server to write query_log now instead of on its flush
+            # interval; this needs the SYSTEM FLUSH LOGS grant, so polling
+            # below still covers the case where it is not allowed
+            try:
+                client.command("SYSTEM FLUSH LOGS")
+                flushed = True
+            except Exception:
+                flushed = False
+
             perf_result = None
-            # wait for 1 minute max
-            for _ in range(60 // 5):
+            # After a flush the entry is normally there already, so the first
+            # poll doesn't wait
+            delay = 0.0 if flushed else 0.25
+            max_wait = PERFORMANCE_WAIT_SECONDS if flushed else PERFORMANCE_WAIT_NO_FLUSH_SECONDS
+            waited = 0.0
+            # back off exponentially between polls, up to the max wait
+            while waited < max_wait:
                 try:
                     # Wait a moment to ensure query_log gets populated
-                    time.sleep(5)
+                    if delay:
+                        time.sleep(delay)
+                        waited += delay
 
                     # Query the system.query_log table for detailed performance metrics
                     # Only use columns we have confirmed access to
@@ -316,6 +653,7 @@ def run_clickhouse_query(query: str, inline_result_limit_bytes: int = 1024, meas
                     WHERE query_id = '{res.query_id}'
                       AND type = 'QueryFinish'
                     LIMIT 1
+                    SETTINGS max_execution_time = 2
                     """
 
                     perf_result = client.query(perf_query)
@@ -331,7 +669,8 @@ def run_clickhouse_query(query: str, inline_result_limit_bytes: int = 1024, meas
                     result[
                         "performance_error"] = f"Failed to retrieve performance data: {str(e)}"
                     break
-            if not perf_result or not perf_result.result_rows:
+                delay = min(max(delay * 2, 0.25), 5.0, max_wait - waited)
+            if "performance" not in result and "performance_error" not in result:
                 result["performance_error"] = "Performance data search timed out"
 
         return result
@@ -359,10 +698,21 @@ def get_clickhouse_schema(table_name: str) -> str:
     Returns:
         str: The schema of the table as a JSON string with columns and create table statement
     """
-    client = get_clickhouse_client()
+    cache_key = ("schema", table_name)
+    cached = get_cached_metadata(cache_key)
+    if cached is not None:
+        return cached
+
+    # Fail early on missing configuration; this thread's client then runs
+    # the first query
+    get_clickhouse_client()
     try:
-        # Get table columns (name and type only)
-        columns_result = client.query(f"DESCRIBE TABLE {table_name}")
+        # Get table columns (name and type only) and the CREATE TABLE statement;
+        # the two queries are independent, so their round trips overlap
+        (columns_result, columns_error), (create_table_result, create_table_error) = \
+            _run_queries_concurrently([f"DESCRIBE TABLE {table_name}", f"SHOW CREATE TABLE {table_name}"])
+        if columns_error is not None:
+            raise columns_error
         if columns_result is None or columns_result.result_rows is None or len(columns_result.result_rows) == 0:
             return "No data returned from the query."
 
@@ -370,8 +720,8 @@ def get_clickhouse_schema(table_name: str) -> str:
         columns = [{"name": row[0], "type": row[1]}
                    for row in columns_result.result_rows]
 
-        # Get CREATE TABLE statement
-        create_table_result = client.query(f"SHOW CREATE TABLE {table_name}")
+        if create_table_error is not None:
+            raise create_table_error
         create_table = create_table_result.result_rows[0][
             0] if create_table_result and create_table_result.result_rows else ""
 
@@ -384,6 +734,7 @@ def get_clickhouse_schema(table_name: str) -> str:
         # Convert to JSON string with size limit
         json_result = safe_json_dumps(
             schema_info, indent=2, max_size=128 * 1024)
+        set_cached_metadata(cache_key, json_result)
         return json_result
     except Exception as e:
         return f"Error: {e}"
@@ -400,14 +751,9 @@ def get_query_execution_stats(last_x_hours: int, limit: int = 10, query_name: Op
     Returns:
         str: The name of the file containing the slow queries as a JSON string
     """
-    query_name_filter = ""
-    if query_name:
-        # Ensure the query_id is sanitized to prevent SQL injection
-        query_name_filter = f"""
-        AND query_id LIKE '%{query_name}%' 
-            """
-
-    QUERY = f"""
+    # Values are bound server-side, so the query text is the same on every call
+    # and user input is never spliced into the SQL
+    QUERY = """
     SELECT
         round(avg(query_duration_ms)) AS realTimeMSAvg,
         sum(query_duration_ms) as realTimeMSTotal,
@@ -420,27 +766,32 @@ def get_query_execution_stats(last_x_hours: int, limit: int = 10, query_name: Op
     FROM
         clusterAllReplicas(default, system.query_log)
     WHERE
-        event_time >= now() - INTERVAL {last_x_hours} HOUR
+        event_time >= now() - INTERVAL {last_x_hours:UInt32} HOUR
         AND event_time < now()
         AND initial_user = 'hud_user'
         AND length(query_id) > 37
         AND type = 'QueryFinish'
         AND left(query_id, -37) != 'adhoc'
-        {query_name_filter}
+        AND query_id LIKE {query_name_pattern:String}
     GROUP BY
         name
     ORDER BY 
         realTimeMSAvg DESC
     LIMIT 
-        {limit}
+        {limit:UInt32}
     """
+    parameters = {
+        "last_x_hours": last_x_hours,
+        "limit": limit,
+        # Without a name filter the pattern matches every query
+        "query_name_pattern": f"%{query_name}%" if query_name else "%",
+    }
 
     client = get_clickhouse_client()
     try:
-        res = client.query(QUERY.format(last_x_hours=last_x_hours))
+        res = client.query(QUERY, parameters=parameters)
         if res is None or res.result_rows is None or len(res.result_rows) == 0:
             return "No data returned from the query."
-        # Find top 5 slowest
 
         return safe_json_dumps(clickhouse_response_to_json(res), indent=2)
     except clickhouse_connect.driver.exceptions.ClickHouseError as e:
@@ -450,6 +801,78 @@ def get_query_execution_stats(last_x_hours: int, limit: int = 10, query_name: Op
 
 
 
+# Long-lived workers for tools that fan out independent queries, so their
+# per-thread clients are reused across calls; one worker per pooled connection
+_query_executor: Optional[ThreadPoolExecutor] = None
+_query_executor_lock = threading.Lock()
+
+# GitHub downloads get their own workers, so slow fetches never hold up
+# ClickHouse queries; one worker per connection the requests session keeps
+_http_executor: Optional[ThreadPoolExecutor] = None
+_http_executor_lock = threading.Lock()
+
+
+def get_query_executor() -> ThreadPoolExecutor:
+    """Get the workers shared by all tools that run queries concurrently.
+
+    Returns:
+        ThreadPoolExecutor: The shared executor, sized by CLICKHOUSE_POOL_SIZE
+
+    Raises:
+        ValueError: If CLICKHOUSE_POOL_SIZE is invalid
+    """
+    global _query_executor
+    with _query_executor_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(
+                max_workers=get_pool_size(), thread_name_prefix="clickhouse-query")
+        return _query_executor
+
+
+def get_http_executor() -> ThreadPoolExecutor:
+    """Get the workers shared by all GitHub downloads.
+
+    Returns:
+        ThreadPoolExecutor: The shared executor, created on first use
+    """
+    global _http_executor
+    with _http_executor_lock:
+        if _http_executor is None:
+            _http_executor = ThreadPoolExecutor(
+                max_workers=requests.adapters.DEFAULT_POOLSIZE, thread_name_prefix="github-fetch")
+        return _http_executor
+
+
+def _run_query(query: str, parameters: Optional[Dict[str, Any]] = None):
+    """Run a single query with the current thread's client.
+
+    Returns:
+        A tuple of (query_result_or_None, exception_or_None)
+    """
+    try:
+        client = get_clickhouse_client()
+        if parameters is None:
+            return client.query(query), None
+        return client.query(query, parameters=parameters), None
+    except Exception as e:
+        return None, e
+
+
+def _run_queries_concurrently(queries):
+    """Run independent queries at the same time.
+
+    The first query runs on the calling thread with its own client, which
+    the tools create up front to fail early on missing configuration; the
+    others run on the shared workers meanwhile.
+
+    Returns:
+        A list of (query_result_or_None, exception_or_None), in query order
+    """
+    executor = get_query_executor() if len(queries) > 1 else None
+    futures = [executor.submit(_run_query, query) for query in queries[1:]]
+    return [_run_query(queries[0])] + [future.result() for future in futures]
+
+
 @mcp.tool()
 def explain_clickhouse_query(
     query: str,
@@ -472,52 +895,42 @@ def explain_clickhouse_query(
     Returns:
         Dict[str, Any]: Dictionary containing results from each requested EXPLAIN type
     """
-    client = get_clickhouse_client()
+    # Fail early on missing configuration; this thread's client then runs
+    # the default EXPLAIN
+    get_clickhouse_client()
     result = {}
 
     try:
-        # Default EXPLAIN (query plan) - always run this
-        try:
-            res = client.query(f"EXPLAIN {query}")
-            if res is not None and res.result_rows is not None and len(res.result_rows) > 0:
-                result["default_explain"] = res.result_rows
-        except Exception as e:
-            result["default_explain_error"] = f"Error: {str(e)}"
-
-        # EXPLAIN PLAN with actions and indexes
+        # Default EXPLAIN (query plan) - always run this, plus the requested types
+        explains = [("default_explain", f"EXPLAIN {query}")]
         if explain_plan:
-            try:
-                plan_res = client.query(
-                    f"EXPLAIN PLAN actions=1, indexes=1 {query}")
-                if plan_res is not None and plan_res.result_rows is not None and len(plan_res.result_rows) > 0:
-                    result["explain_plan"] = plan_res.result_rows
-            except Exception as e:
-                result["explain_plan_error"] = f"Error: {str(e)}"
-
-        # EXPLAIN PIPELINE with graph
+            # EXPLAIN PLAN with actions and indexes
+            explains.append(
+                ("explain_plan", f"EXPLAIN PLAN actions=1, indexes=1 {query}"))
         if explain_pipeline:
-            try:
-                pipe_res = client.query(f"EXPLAIN PIPELINE graph=1 {query}")
-                if pipe_res is not None and pipe_res.result_rows is not None and len(pipe_res.result_rows) > 0:
-                    result["explain_pipeline"] = pipe_res.result_rows
-            except Exception as e:
-                result["explain_pipeline_error"] = f"Error: {str(e)}"
-
-        # EXPLAIN ESTIMATE
+            # EXPLAIN PIPELINE with graph
+            explains.append(
+                ("explain_pipeline", f"EXPLAIN PIPELINE graph=1 {query}"))
         if explain_estimate:
-            try:
-                est_res = client.query(f"EXPLAIN ESTIMATE {query}")
-                if est_res is not None and est_res.result_rows is not None and len(est_res.result_rows) > 0:
-                    result["explain_estimate"] = est_res.result_rows
-                elif est_res is not None and est_res.column_names is not None:
-                    # EXPLAIN ESTIMATE might return empty rows but with column names
-                    result["explain_estimate"] = {
-                        "columns": est_res.column_names,
-                        "rows": [],
-                        "note": "No estimate data returned, query might be too simple or not supported for estimation"
-                    }
-            except Exception as e:
-                result["explain_estimate_error"] = f"Error: {str(e)}"
+            explains.append(("explain_estimate", f"EXPLAIN ESTIMATE {query}"))
+
+        # Run the EXPLAINs concurrently, each on its thread's own client, so
+        # the round trips overlap instead of adding up
+        outcomes = _run_queries_concurrently(
+            [explain_query for _, explain_query in explains])
+
+        for (key, _), (res, error) in zip(explains, outcomes):
+            if error is not None:
+                result[f"{key}_error"] = f"Error: {str(error)}"
+            elif res is not None and res.result_rows is not None and len(res.result_rows) > 0:
+                result[key] = res.result_rows
+            elif key == "explain_estimate" and res is not None and res.column_names is not None:
+                # EXPLAIN ESTIMATE might return empty rows but with column names
+                result[key] = {
+                    "columns": res.column_names,
+                    "rows": [],
+                    "note": "No estimate data returned, query might be too simple or not supported for estimation"
+                }
 
         # Return the dictionary result directly
         if not result:
@@ -541,6 +954,11 @@ def get_clickhouse_tables(database: Optional[str] = "default", databases: Option
     Returns:
         str: The list of tables as a JSON string, grouped by database if multiple are requested
     """
+    cache_key = ("tables", database, databases)
+    cached = get_cached_metadata(cache_key)
+    if cached is not None:
+        return cached
+
     client = get_clickhouse_client()
     try:
         if databases == "all":
@@ -548,8 +966,13 @@ def get_clickhouse_tables(database: Optional[str] = "default", databases: Option
             dbs_to_query = ["default", "benchmark", "misc"]
             all_tables = {}
 
-            for db in dbs_to_query:
-                res = client.query(f"SHOW TABLES FROM {db}")
+            # The databases are listed concurrently, each on its own client
+            outcomes = _run_queries_concurrently(
+                [f"SHOW TABLES FROM {db}" for db in dbs_to_query])
+
+            for db, (res, error) in zip(dbs_to_query, outcomes):
+                if error is not None:
+                    raise error
                 if res is not None and res.result_rows is not None and len(res.result_rows) > 0:
                     # Group tables by database
                     all_tables[db] = res.result_rows
@@ -558,6 +981,7 @@ def get_clickhouse_tables(database: Optional[str] = "default", databases: Option
 
             # Convert to JSON string with size limit
             json_result = safe_json_dumps(all_tables, indent=2)
+            set_cached_metadata(cache_key, json_result)
             return json_result
         else:
             # Query tables from a single database
@@ -567,6 +991,7 @@ def get_clickhouse_tables(database: Optional[str] = "default", databases: Option
 
             # Convert to JSON string with size limit
             json_result = safe_json_dumps(res.result_rows, indent=2)
+            set_cached_metadata(cache_key, json_result)
             return json_result
     except Exception as e:
         return f"Error: {e}"
@@ -589,39 +1014,60 @@ def get_query_details(query_name: str, include_params: Optional[bool] = True, in
     query_url = f"https://raw.githubusercontent.com/pytorch/test-infra/refs/heads/main/torchci/clickhouse_queries/{query_name}/query.sql"
     params_url = f"https://raw.githubusercontent.com/pytorch/test-infra/refs/heads/main/torchci/clickhouse_queries/{query_name}/params.json"
 
+    # The GitHub downloads and the ClickHouse lookup are independent, so start
+    # them all at once and collect the results below
+    COLUMN_NAMES = ["event_time", "query_id",
+                    "query_duration_ms", "memory_usage", "query"]
+    http_executor = get_http_executor()
+    query_future = http_executor.submit(fetch_github_text, query_url)
+    params_future = http_executor.submit(
+        fetch_github_text, params_url) if include_params else None
+    performance_future = None
+    if include_performance_samples > 0:
+        performance_query = f"""
+        SELECT {', '.join(COLUMN_NAMES)}
+        FROM clusterAllReplicas(default, system.query_log)
+        WHERE left(query_id, -37) = {{query_name:String}}
+        AND type = 'QueryFinish'
+        ORDER BY event_time DESC
+        LIMIT {{samples:UInt32}}
+        """
+        performance_future = get_query_executor().submit(_run_query, performance_query, {
+            "query_name": query_name,
+            "samples": include_performance_samples,
+        })
+
     try:
-        query = requests.get(query_url).text
+        query = query_future.result()
         # Fix literal '\n' character sequences (2 chars) with actual newlines
         query = query.replace("\\n", "\n").strip()
         result_json["query"] = query
     except Exception as e:
+        # The other lookups are no longer needed: drop the ones that haven't
+        # started and let the running ones finish, so no worker keeps using a
+        # client after the tool has answered
+        pending = [future for future in (params_future, performance_future) if future is not None]
+        for future in pending:
+            future.cancel()
+        concurrent.futures.wait(pending)
         result_json["error"] = f"Error: Failed to get query from {query_url}. {e}"
         return json.dumps(result_json)
 
     # get the params from the url if include_params is True
-    if include_params:
+    if params_future is not None:
         try:
-            params = requests.get(params_url).text
+            params = params_future.result()
             params_dict = json.loads(params)
             result_json["params"] = params_dict
         except Exception as e:
             result_json["error"] = f"Error: Failed to get params from {params_url}. {e}"
 
     # get the performance samples from the ClickHouse system table
-    if include_performance_samples > 0:
+    if performance_future is not None:
         try:
-            COLUMN_NAMES = ["event_time", "query_id",
-                            "query_duration_ms", "memory_usage", "query"]
-            performance_query = f"""
-            SELECT {', '.join(COLUMN_NAMES)}
-            FROM clusterAllReplicas(default, system.query_log)
-            WHERE left(query_id, -37) = '{query_name}' 
-            AND type = 'QueryFinish'
-            ORDER BY event_time DESC
-            LIMIT {include_performance_samples}
-            """
-            client = get_clickhouse_client()
-            res = client.query(performance_query)
+            res, error = performance_future.result()
+            if error is not None:
+                raise error
             if res and res.result_rows:
                 result_json["performance_samples"] = [
                     dict(zip(COLUMN_NAMES, row)) for row in res.result_rows
@@ -636,10 +1082,22 @@ def get_query_details(query_name: str, include_params: Optional[bool] = True, in
 
 
 # Vector store singleton
-vector_store_instance: Optional[FAISS] = None
+vector_store_instance: Optional["FAISS"] = None
+_vector_store_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _get_embeddings():
+    """Get the Bedrock embeddings client, created on first use."""
+    from langchain_aws import BedrockEmbeddings
+
+    return BedrockEmbeddings(
+        region_name=DEFAULT_REGION,
+        model_id=DEFAULT_BEDROCK_MODEL
+    )
 
 
-def get_vector_store() -> FAISS:
+def get_vector_store() -> "FAISS":
     """Get or initialize the vector store singleton.
 
     Returns:
@@ -648,19 +1106,39 @@ def get_vector_store() -> FAISS:
     global vector_store_instance
 
     if vector_store_instance is None:
-        # Initialize embeddings
-        embeddings = BedrockEmbeddings(
-            region_name=DEFAULT_REGION,
-            model_id=DEFAULT_BEDROCK_MODEL
-        )
+        with _vector_store_lock:
+            # Concurrent first searches load the index only once
+            if vector_store_instance is None:
+                from .vector_search import load_faiss_index, get_default_index_path
 
-        # Load the FAISS index
-        index_path = get_default_index_path()
-        vector_store_instance = load_faiss_index(index_path, embeddings)
+                # Load the FAISS index
+                index_path = get_default_index_path()
+                vector_store_instance = load_faiss_index(index_path, _get_embeddings())
 
     return vector_store_instance
 
 
+def warm_vector_store() -> threading.Thread:
+    """Load the vector store in the background, so the first semantic search
+    doesn't pay for building the Bedrock client and loading FAISS.
+
+    Failures are logged as warnings, so a broken RAG setup shows up at
+    startup; semantic_search_docs retries the load and reports the error.
+
+    Returns:
+        threading.Thread: The (daemon) thread loading the vector store
+    """
+    def warm():
+        try:
+            get_vector_store()
+        except Exception:
+            logger.warning("Failed to preload the vector store", exc_info=True)
+
+    thread = threading.Thread(target=warm, name="vector-store-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
 @mcp.tool()
 def semantic_search_docs(
     query: str,
@@ -680,6 +1158,8 @@ def semantic_search_docs(
         The formatted search results with markdown content
     """
     try:
+        from .vector_search import vector_search
+
         # Get the vector store singleton
         vector_store = get_vector_store()
 
@@ -687,7 +1167,8 @@ def semantic_search_docs(
         start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
 
-        # We need to fetch enough results to cover the requested page
+        # FAISS has no offset, so fetch enough results to cover the requested
+        # page; only that page is formatted below
         num_results = end_idx
 
         # Perform the semantic search
@@ -695,35 +1176,42 @@ def semantic_search_docs(
 
         # Apply pagination
         paginated_results = search_results[start_idx:end_idx]
+        total_pages = (len(search_results) + per_page - 1) // per_page
 
-        # Prepare result text with clear delimiters
-        results_text = f"Search results for: '{query}'\n\n"
-        results_text += f"Page {page} of {(len(search_results) + per_page - 1) // per_page} "
-        results_text += f"({len(search_results)} total results)\n\n"
+        # Prepare result text with clear delimiters; collected in a list and
+        # joined once instead of growing a string
+        parts = [
+            f"Search results for: '{query}'\n\n",
+            f"Page {page} of {total_pages} ",
+            f"({len(search_results)} total results)\n\n",
+        ]
 
         # Format each result with delimiters
         for i, result in enumerate(paginated_results):
-            results_text += f"==== RESULT {i+1} ====\n"
-            results_text += f"DOCUMENT: {result.metadata.get('document_title', 'Unknown')}\n"
-            results_text += f"SECTION: {result.metadata.get('section_title', 'Unknown')}\n"
-            results_text += f"SOURCE: {result.metadata.get('path', 'Unknown')}\n"
-            results_text += "CONTENT:\n"
+            metadata = result.metadata
 
             # Include content with truncation if needed
             content = result.page_content
             if limit and len(content) > limit:
                 content = content[:limit] + "...(truncated)"
 
-            results_text += content + "\n"
-            results_text += "==================\n\n"
+            parts.append(
+                f"==== RESULT {i+1} ====\n"
+                f"DOCUMENT: {metadata.get('document_title', 'Unknown')}\n"
+                f"SECTION: {metadata.get('section_title', 'Unknown')}\n"
+                f"SOURCE: {metadata.get('path', 'Unknown')}\n"
+                "CONTENT:\n"
+                f"{content}\n"
+                "==================\n\n"
+            )
 
         # Add pagination instructions
         if page > 1:
-            results_text += "For previous results: Use page=" + \
-                str(page-1) + "\n"
-        if page < (len(search_results) + per_page - 1) // per_page:
-            results_text += "For more results: Use page=" + str(page+1) + "\n"
+            parts.append(f"For previous results: Use page={page-1}\n")
+        if page < total_pages:
+            parts.append(f"For more results: Use page={page+1}\n")
 
+        results_text = "".join(parts)
         return results_text
 
     except FileNotFoundError:
@@ -733,6 +1221,61 @@ def semantic_search_docs(
 
 
 
+@lru_cache(maxsize=8)
+def get_sqlfluff_linter(exclude_rules: Optional[Tuple[str, ...]] = None):
+    """Get a ClickHouse SQLFluff linter, built once per set of excluded rules.
+
+    Loading the config, dialect and rule set is the slow part of a lint, so
+    linters are reused across calls instead of being rebuilt like the
+    sqlfluff.lint / sqlfluff.fix helpers do.
+
+    Args:
+        exclude_rules: Rule codes to exclude, or None to use all rules
+
+    Returns:
+        sqlfluff.core.Linter: The cached linter
+    """
+    from sqlfluff.api.simple import get_simple_config
+    from sqlfluff.core import Linter
+
+    config = get_simple_config(
+        dialect="clickhouse",
+        exclude_rules=list(exclude_rules) if exclude_rules else None)
+    return Linter(config=config)
+
+
+def _linter_for(exclude_rules: Optional[list]):
+    # Equal rule sets share one cached linter regardless of order
+    return get_sqlfluff_linter(tuple(sorted(set(exclude_rules))) if exclude_rules else None)
+
+
+def sqlfluff_lint_fix(query: str, exclude_rules: Optional[list] = None) -> Tuple[list, str]:
+    """Lint and fix a ClickHouse query from a single parse, with a cached linter.
+
+    Equivalent to calling sqlfluff.lint and then sqlfluff.fix, which would
+    each template and parse the query again.
+
+    Args:
+        query: The SQL query to lint
+        exclude_rules: Rule codes to exclude, or None to use all rules
+
+    Returns:
+        Tuple[list, str]: The violations found as dicts, and the fixed query
+        (the input itself if it could not be parsed)
+    """
+    linter = _linter_for(exclude_rules)
+    result = linter.lint_string_wrapped(query, fix=True)
+    records = result.as_records()
+    violations = [] if not records else records[0]["violations"]
+
+    if not linter.config.get("fix_even_unparsable"):
+        # Don't fix queries with templating or parse errors
+        _, num_filtered_errors = result.count_tmp_prs_errors()
+        if num_filtered_errors > 0:
+            return violations, query
+    return violations, result.paths[0].files[0].fix_string()[0]
+
+
 @mcp.tool()
 def lint_clickhouse_query(
     query: str,
@@ -761,53 +1304,42 @@ def lint_clickhouse_query(
 
     try:
         # Set up config for sqlfluff
-        config = {
-            "dialect": "clickhouse"
-        }
+        exclude_rules = None
         if rule_exclude:
-            config["exclude_rules"] = rule_exclude.split(",")
-
-        # Create a temporary file for better error reporting
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False) as tmp_file:
-            tmp_file.write(query)
-            tmp_path = tmp_file.name
-
-        try:
-            # Lint the query
-            linting_result = sqlfluff.lint(tmp_path, config=config)
-
-            # Format the query
-            formatted_result = sqlfluff.fix(tmp_path, config=config)
-            formatted_query = formatted_result.get("fix_str", query)
-
-            # Process the linting results
-            errors = []
-            for violation in linting_result:
-                errors.append({
-                    "rule": violation.rule_code(),
-                    "description": violation.description(),
-                    "line": violation.line_no,
-                    "position": violation.line_pos,
-                    "context": violation.line_str if hasattr(violation, "line_str") else None
-                })
+            exclude_rules = [rule.strip()
+                             for rule in rule_exclude.split(",") if rule.strip()]
+
+        # Lint and format the query string directly, no temporary file needed
+        linting_result, formatted_query = sqlfluff_lint_fix(query, exclude_rules)
+
+        # Process the linting results
+        query_lines = query.splitlines()
+        errors = []
+        for violation in linting_result:
+            # sqlfluff < 3 reports line_no/line_pos instead of start_line_no/start_line_pos
+            line_no = violation.get("start_line_no", violation.get("line_no"))
+            errors.append({
+                "rule": violation["code"],
+                "description": violation["description"],
+                "line": line_no,
+                "position": violation.get("start_line_pos", violation.get("line_pos")),
+                "context": query_lines[line_no - 1] if line_no and line_no <= len(query_lines) else None
+            })
+
+        # Return structured results
+        is_passing = len(errors) == 0
+
+        # Only include formatted_query if it's different from input and there were errors
+        formatted_query_output = None
+        if not is_passing and formatted_query != query:
+            formatted_query_output = formatted_query
 
-            # Return structured results
-            is_passing = len(errors) == 0
-
-            # Only include formatted_query if it's different from input and there were errors
-            formatted_query_output = None
-            if not is_passing and formatted_query != query:
-                formatted_query_output = formatted_query
-
-            return {
-                "status": "pass" if is_passing else "fail",
-                "errors_count": len(errors),
-                "errors": errors,
-                "formatted_query": formatted_query_output
-            }
-        finally:
-            # Clean up the temporary file
-            os.unlink(tmp_path)
+        return {
+            "status": "pass" if is_passing else "fail",
+            "errors_count": len(errors),
+            "errors": errors,
+            "formatted_query": formatted_query_output
+        }
 
     except Exception as e:
         return {
@@ -821,4 +1353,5 @@ def lint_clickhouse_query(
 
 # Run the server if executed directly
 if __name__ == "__main__":
+    warm_vector_store()
     mcp.run(transport="sse", host="0.0.0.0")
@@ -1,6 +1,9 @@
 """Vector search utilities for ClickHouse documentation."""
 
+import math
 import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
@@ -9,6 +12,24 @@ from langchain_community.vectorstores import FAISS
 
 from .docs_search import get_project_root, get_package_root
 
+# Exhaustive (flat) search takes a few milliseconds for small corpora. Larger
+# indexes are partitioned into inverted lists, so a query only scans the
+# lists closest to it instead of every vector: IVF_PROBE_FRACTION of them,
+# and at least IVF_MIN_NPROBE. The IVF index is only used if its recall@10
+# against exact search, measured on a sample of the vectors, reaches
+# IVF_MIN_RECALL without scanning more than IVF_MAX_PROBE_FRACTION of the lists
+IVF_MIN_VECTORS = 20000
+IVF_PROBE_FRACTION = 0.05
+IVF_MIN_NPROBE = 16
+IVF_MIN_RECALL = 0.95
+IVF_MAX_PROBE_FRACTION = 0.25
+IVF_RECALL_QUERIES = 200
+
+# Chunks are embedded in batches (one request per batch for models with
+# multi-text embedding, such as Cohere), with several batches in flight
+EMBED_BATCH_SIZE = 96
+EMBED_WORKERS = 16
+
 
 def get_default_index_path() -> Path:
     """Get the default path to the FAISS index."""
@@ -46,7 +67,16 @@ def create_faiss_index(
     print(f"Creating FAISS index with {len(documents)} documents...")
     
     # Create the FAISS index
-    vector_store = FAISS.from_documents(documents, embeddings)
+    texts = [doc.page_content for doc in documents]
+    vectors = embed_texts(texts, embeddings)
+    vector_store = FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[doc.metadata for doc in documents]
+    )
+    if vector_store.index.ntotal >= IVF_MIN_VECTORS:
+        print(f"Partitioning {vector_store.index.ntotal} vectors into an IVF index...")
+        vector_store.index = partition_index(vector_store.index)
 
     # Create output directory if it doesn't exist
     os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
@@ -56,6 +86,130 @@ def create_faiss_index(
     print(f"FAISS index saved to {output_path}")
 
 
+def embed_texts(
+    texts: List[str],
+    embeddings,
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_workers: int = EMBED_WORKERS,
+) -> List[List[float]]:
+    """Embed texts concurrently, in batches.
+    
+    Embedding is bound by the per-request latency of the model endpoint,
+    so batches are sent from a thread pool instead of one after another.
+    
+    Args:
+        texts: Texts to embed.
+        embeddings: Embedding model to use.
+        batch_size: Number of texts per embed_documents call.
+        max_workers: Number of batches embedded at the same time.
+        
+    Returns:
+        One embedding per text, in the same order as texts.
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if len(batches) <= 1:
+        return embeddings.embed_documents(texts) if texts else []
+    
+    vectors = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        for batch_vectors in executor.map(embeddings.embed_documents, batches):
+            vectors.extend(batch_vectors)
+    return vectors
+
+
+def build_ivf_index(index, nprobe: Optional[int] = None):
+    """Convert a flat FAISS index into an IVF index with the same vectors.
+    
+    Vectors are stored uncompressed, so distances stay exact and only the
+    search is approximate. nprobe is saved with the index, so loading it
+    needs no extra setup.
+    
+    Args:
+        index: Flat FAISS index holding the vectors
+        nprobe: Number of inverted lists to scan per query. If None, a fixed
+            fraction of the lists (IVF_PROBE_FRACTION, at least IVF_MIN_NPROBE)
+        
+    Returns:
+        The trained and populated IVF index
+    """
+    import faiss
+    
+    num_vectors = index.ntotal
+    # ~4*sqrt(N) lists, keeping enough vectors per list to train the centroids
+    nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+    vectors = index.reconstruct_n(0, num_vectors)
+    
+    quantizer = faiss.IndexFlat(index.d, index.metric_type)
+    ivf = faiss.IndexIVFFlat(quantizer, index.d, nlist, index.metric_type)
+    ivf.train(vectors)
+    ivf.add(vectors)
+    if nprobe is None:
+        nprobe = max(IVF_MIN_NPROBE, math.ceil(nlist * IVF_PROBE_FRACTION))
+    ivf.nprobe = min(nprobe, nlist)
+    return ivf
+
+
+def ivf_recall(index, ivf, k: int = 10, num_queries: int = IVF_RECALL_QUERIES) -> float:
+    """Measure the recall@k of an IVF index against exact search.
+    
+    A deterministic sample of the indexed vectors is used as queries; each
+    query's own vector is left out of both result lists.
+    
+    Args:
+        index: Flat FAISS index holding the vectors
+        ivf: IVF index built from the same vectors (see build_ivf_index)
+        k: Number of neighbours compared per query
+        num_queries: Number of sampled queries
+        
+    Returns:
+        The fraction of the exact k nearest neighbours the IVF index finds
+    """
+    import numpy as np
+    
+    query_ids = np.random.RandomState(0).choice(
+        index.ntotal, min(num_queries, index.ntotal), replace=False)
+    queries = index.reconstruct_batch(query_ids)
+    _, exact_ids = index.search(queries, k + 1)
+    _, ivf_ids = ivf.search(queries, k + 1)
+    
+    found = total = 0
+    for query_id, exact, approximate in zip(query_ids, exact_ids, ivf_ids):
+        expected = [i for i in exact if i != query_id and i != -1][:k]
+        found += len(set(expected) & set(approximate))
+        total += len(expected)
+    return found / total if total else 1.0
+
+
+def partition_index(index, min_recall: float = IVF_MIN_RECALL):
+    """Build an IVF index for a flat one, if it is accurate enough.
+    
+    The number of lists scanned starts from build_ivf_index's default and is
+    doubled until the recall reaches min_recall. If that takes more than
+    IVF_MAX_PROBE_FRACTION of the lists, the IVF index is barely faster
+    than exact search, so the flat index is kept.
+    
+    Args:
+        index: Flat FAISS index holding the vectors
+        min_recall: Required recall@10 against exact search
+        
+    Returns:
+        The IVF index, or the flat index unchanged
+    """
+    ivf = build_ivf_index(index)
+    max_nprobe = max(1, int(ivf.nlist * IVF_MAX_PROBE_FRACTION))
+    recall = ivf_recall(index, ivf)
+    while recall < min_recall and ivf.nprobe < max_nprobe:
+        ivf.nprobe = min(ivf.nprobe * 2, max_nprobe)
+        recall = ivf_recall(index, ivf)
+    
+    if recall < min_recall:
+        print(f"IVF recall@10 is only {recall:.2f} when scanning {ivf.nprobe} of "
+              f"{ivf.nlist} lists, keeping the exact (flat) index")
+        return index
+    print(f"IVF index scans {ivf.nprobe} of {ivf.nlist} lists, recall@10 {recall:.2f}")
+    return ivf
+
+
 def load_faiss_index(
     index_path: Optional[str] = None,
     embeddings = None,
@@ -75,7 +229,39 @@ def load_faiss_index(
     if not os.path.exists(index_path):
         raise FileNotFoundError(f"FAISS index not found at {index_path}")
     
-    return FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    # Same as FAISS.load_local, except that the vectors are memory-mapped
+    index_path = Path(index_path)
+    index = read_faiss_index_mmap(str(index_path / "index.faiss"))
+    
+    # The docstore is the index's own pickle, created by create_faiss_index
+    with open(index_path / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def read_faiss_index_mmap(path: str):
+    """Read a FAISS index with its vectors memory-mapped instead of copied.
+    
+    The OS pages vectors in on demand and can share them between processes.
+    Falls back to a regular read on FAISS versions (or index types) without
+    mmap support.
+    
+    Args:
+        path: Path to the .faiss file
+        
+    Returns:
+        The FAISS index
+    """
+    import faiss
+    
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_flag is not None:
+        try:
+            return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
 
 
 def vector_search(
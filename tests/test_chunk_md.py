@@ -2,6 +2,10 @@
 
 import sys
 import os
+import re
+import tempfile
+import threading
+import time
 import unittest
 
 # Add the tools directory to the path so we can import chunk_md
@@ -98,7 +102,60 @@ Content for section 3."""
         self.assertIn("Content for section 1.", headers[1]["content"])
         self.assertIn("Content for section 2.", headers[2]["content"])
         self.assertIn("Content for section 3.", headers[3]["content"])
-        
+
+    def test_split_at_headers_matches_regex_split(self):
+        """Test that the linear header scan splits exactly like the regex split."""
+        content = "Intro\n## First\nBody\n### Sub\nMore\n##NoSpace\n ## Indented\n## Second"
+
+        for marker in ("##", "###"):
+            self.assertEqual(
+                chunk_md.split_at_headers(content, marker),
+                re.split(f"(?m)^{marker} ", content)
+            )
+
+        # Header on the very first line yields an empty leading part
+        self.assertEqual(chunk_md.split_at_headers("## A\ntext", "##"), ["", "A\ntext"])
+
+    def _write_files(self, directory, count):
+        filepaths = []
+        for i in range(count):
+            filepath = os.path.join(directory, f"doc_{i}.md")
+            with open(filepath, "w", encoding="utf-8") as f:
+                f.write(f"# Doc {i}\n")
+            filepaths.append(filepath)
+        return filepaths
+
+    def test_prefetch_files(self):
+        """Test that prefetched files come back in order, with read errors reported."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepaths = self._write_files(tmp_dir, 3)
+            missing = os.path.join(tmp_dir, "missing.md")
+
+            results = list(chunk_md._prefetch_files(filepaths[:2] + [missing] + filepaths[2:], maxsize=1))
+
+        self.assertEqual([filepath for filepath, _, _ in results], filepaths[:2] + [missing] + filepaths[2:])
+        self.assertEqual([content for _, content, _ in results], ["# Doc 0\n", "# Doc 1\n", None, "# Doc 2\n"])
+        self.assertIsNone(results[0][2])
+        self.assertIn("FileNotFoundError", results[2][2])
+
+    def test_prefetch_files_stops_reader_when_consumer_stops(self):
+        """Test that the reader thread exits when the consumer stops early."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepaths = self._write_files(tmp_dir, 10)
+
+            threads_before = set(threading.enumerate())
+            prefetch = chunk_md._prefetch_files(filepaths, maxsize=2)
+            self.assertEqual(next(prefetch)[0], filepaths[0])
+            reader_threads = set(threading.enumerate()) - threads_before
+            self.assertEqual(len(reader_threads), 1)
+            # Give the reader time to fill the buffer and block on it
+            time.sleep(0.2)
+            prefetch.close()
+
+            reader_thread = reader_threads.pop()
+            reader_thread.join(timeout=5)
+            self.assertFalse(reader_thread.is_alive(), "prefetch reader thread still running")
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,37 +1,117 @@
 import os
+import threading
+import time
 import unittest
 import json
+import datetime
+import decimal
+import hashlib
+import io
+import orjson
+import requests
 from unittest import skipUnless, mock
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+from clickhouse_connect.driver.client import Client
+
+from clickhouse_mcp import mcp_server
 from clickhouse_mcp.mcp_server import (
+    clear_github_cache,
+    clear_metadata_cache,
+    get_clickhouse_client,
     run_clickhouse_query,
     get_clickhouse_schema,
     explain_clickhouse_query,
     get_clickhouse_tables,
+    get_query_details,
+    get_query_execution_stats,
     lint_clickhouse_query,
     safe_json_dumps,
     MAX_RESPONSE_SIZE
 )
 
 
+def query_result(rows, columns=(), query_id=""):
+    """Build a lightweight stand-in for a clickhouse_connect QueryResult."""
+    return SimpleNamespace(result_rows=rows, column_names=list(columns), query_id=query_id)
+
+
+class FakeFile(io.BytesIO):
+    """In-memory binary file that keeps its contents after being closed."""
+
+    def __init__(self):
+        super().__init__()
+        self.write_count = 0
+
+    def write(self, data):
+        self.write_count += 1
+        return super().write(data)
+
+    def close(self):
+        pass
+
+
 class TestClickhouseQuery(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # Patch the clickhouse client once for the whole class
+        cls.client_patcher = patch('clickhouse_mcp.mcp_server.get_clickhouse_client')
+        cls.mock_get_client = cls.client_patcher.start()
+        # spec keeps the mock to the real client's API
+        cls.mock_client = MagicMock(spec=Client)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client_patcher.stop()
+
     def setUp(self):
-        # Create a patch for the clickhouse client
-        self.client_patcher = patch('clickhouse_mcp.mcp_server.get_clickhouse_client')
-        self.mock_get_client = self.client_patcher.start()
-        self.mock_client = MagicMock()
+        # Forget calls and configured results from previous tests
+        self.mock_client.reset_mock(return_value=True, side_effect=True)
+        self.mock_get_client.reset_mock(return_value=True, side_effect=True)
         self.mock_get_client.return_value = self.mock_client
+        clear_metadata_cache()
+        clear_github_cache()
 
     def tearDown(self):
-        self.client_patcher.stop()
+        clear_metadata_cache()
+        clear_github_cache()
 
     def test_safe_json_dumps_within_limit(self):
         """Test that json dumps works correctly when data is within size limit."""
         data = {"test": "data"}
         result = safe_json_dumps(data, max_size=1000)
-        self.assertEqual(json.loads(result), data)
+        self.assertEqual(orjson.loads(result), data)
+
+    def test_safe_json_dumps_serializes_datetimes(self):
+        """Test that datetimes and non-ASCII text are serialized."""
+        data = [{"created": datetime.datetime(2024, 1, 2, 3, 4, 5), "name": "café"}]
+        result = safe_json_dumps(data)
+        self.assertEqual(json.loads(result), [{"created": "2024-01-02T03:04:05", "name": "café"}])
+
+    def test_dumps_json_bytes_serializes_decimals_and_dates(self):
+        """Test that Decimal and date values are encoded, including in the stdlib fallback."""
+        row = (decimal.Decimal("12.3400"), datetime.date(2024, 1, 2), datetime.datetime(2024, 1, 2, 3, 4, 5))
+        expected = ["12.3400", "2024-01-02", "2024-01-02T03:04:05"]
+        self.assertEqual(json.loads(mcp_server.dumps_json_bytes(row)), expected)
+
+        # Integers wider than 64 bits make orjson fall back to the json module
+        wide_row = row + (2 ** 100,)
+        self.assertEqual(json.loads(mcp_server.dumps_json_bytes(wide_row)), expected + [2 ** 100])
+
+    def test_run_clickhouse_query_keeps_wide_ints_inline(self):
+        """Test that UInt128/Int256 values stay exact in the inline rows."""
+        wide_int = 2 ** 100 + 1
+        self.mock_client.query.return_value = query_result([(wide_int, "a")], ["big", "name"], query_id="wide_query_id")
+
+        result_file = FakeFile()
+        with patch('builtins.open', return_value=result_file):
+            result = run_clickhouse_query("SELECT * FROM test_table")
+
+        self.assertEqual(result["result_rows"], [[wide_int, "a"]])
+        self.assertIsInstance(result["result_rows"][0][0], int)
+        self.assertEqual(json.loads(result_file.getvalue()), [[wide_int, "a"]])
 
     def test_safe_json_dumps_exceeds_limit(self):
         """Test that json dumps truncates data when it exceeds the size limit."""
@@ -43,34 +123,79 @@ class TestClickhouseQuery(unittest.TestCase):
         self.assertIn("<RESPONSE TRUNCATED>", result)
         self.assertLess(len(result), MAX_RESPONSE_SIZE + 100)  # Allow some buffer for the warning message
 
+    def test_safe_json_dumps_truncates_lists_by_item(self):
+        """Test that oversized lists are cut between items, keeping valid JSON."""
+        rows = [["row", i, "x" * 50] for i in range(1000)]
+        result = safe_json_dumps(rows)
+
+        json_part = result[:result.index("\n\n<RESPONSE TRUNCATED>")]
+        warning = result[len(json_part):]
+        truncated_rows = json.loads(json_part)
+        self.assertLessEqual(len(result), MAX_RESPONSE_SIZE)
+        self.assertEqual(truncated_rows, rows[:len(truncated_rows)])
+        self.assertGreater(len(truncated_rows), 0)
+        # Exactly the longest prefix that fits is kept
+        next_prefix = json.dumps(rows[:len(truncated_rows) + 1], indent=2)
+        self.assertGreater(len(next_prefix) + len(warning), MAX_RESPONSE_SIZE)
+
+    def test_safe_json_dumps_keeps_oversized_first_item(self):
+        """Test that a list whose first item alone is too large is cut at the limit."""
+        rows = [["x" * MAX_RESPONSE_SIZE], ["small"]]
+        result = safe_json_dumps(rows)
+
+        self.assertIn("<RESPONSE TRUNCATED>", result)
+        self.assertTrue(result.startswith('[\n  [\n    "xxx'))
+        self.assertLessEqual(len(result), MAX_RESPONSE_SIZE)
+
+    def test_safe_json_dumps_utf8_with_wide_ints(self):
+        """Test that the stdlib fallback for wide integers keeps non-ASCII text as UTF-8."""
+        result = safe_json_dumps([[2 ** 100, "café"]])
+        self.assertIn("café", result)
+        self.assertEqual(json.loads(result), [[2 ** 100, "café"]])
+
     def test_run_clickhouse_query_success(self):
         """Test running a query successfully."""
         # Setup mock return value
-        mock_result = MagicMock()
-        mock_result.result_rows = [{"column1": "value1", "column2": "value2"}]
-        mock_result.column_names = ["column1", "column2"]
-        mock_result.query_id = "test_query_id"
+        mock_result = query_result([{"column1": "value1", "column2": "value2"}], ["column1", "column2"], query_id="test_query_id")
         self.mock_client.query.return_value = mock_result
 
-        # Call the function
-        with patch('builtins.open', mock.mock_open()) as mock_file:
+        # Call the function, capturing the result file in memory
+        result_file = FakeFile()
+        with patch('builtins.open', return_value=result_file) as mock_file:
             result = run_clickhouse_query("SELECT * FROM test_table")
         
         # Assertions
         self.mock_client.query.assert_called_once_with("SELECT * FROM test_table")  # No settings since measure_performance=False
-        mock_file.assert_called_once()
+        mock_file.assert_called_once_with(result["result_file"], "wb")
+        # Rows are streamed to the file as they are encoded, one row per line
+        self.assertGreater(result_file.write_count, 1)
+        self.assertEqual(result_file.getvalue(), b'[\n  {"column1":"value1","column2":"value2"}\n]')
+        self.assertEqual(json.loads(result_file.getvalue()), mock_result.result_rows)
         self.assertTrue("result_file" in result)
         self.assertTrue("/tmp/clickhouse_query_result_" in result["result_file"])
         self.assertTrue(result["result_file"].endswith(".json"))
         self.assertEqual(result["query_id"], "test_query_id")  # Check query_id is included in results
 
+    def test_run_clickhouse_query_removes_partial_result_file(self):
+        """Test that a row that can't be serialized doesn't leave a truncated file behind."""
+        mock_result = query_result([("ok",), (object(),)], ["column1"], query_id="bad_query_id")
+        self.mock_client.query.return_value = mock_result
+
+        result_file = FakeFile()
+        with patch('builtins.open', return_value=result_file), \
+                patch.object(mcp_server.os, "remove") as mock_remove:
+            result = run_clickhouse_query("SELECT * FROM test_table")
+
+        self.assertIn("Unexpected error during query execution", result["error"])
+        self.assertNotIn("result_file", result)
+        # The first row had already been written when the second one failed
+        self.assertTrue(result_file.getvalue().startswith(b'[\n  ["ok"]'))
+        mock_remove.assert_called_once_with("/tmp/clickhouse_query_result_bad_query_id.json")
+
     def test_run_clickhouse_query_empty_result(self):
         """Test running a query that returns no data."""
         # Setup mock return value for empty result
-        mock_result = MagicMock()
-        mock_result.result_rows = []
-        mock_result.column_names = ["column1", "column2"]
-        mock_result.query_id = "empty_query_id"
+        mock_result = query_result([], ["column1", "column2"], query_id="empty_query_id")
         self.mock_client.query.return_value = mock_result
 
         # Call the function
@@ -85,23 +210,59 @@ class TestClickhouseQuery(unittest.TestCase):
         self.assertEqual(result["result_rows"], [])
         self.assertEqual(result["query_id"], "empty_query_id")
         self.assertEqual(result["columns"], ["column1", "column2"])
-        
+
+        # The hash covers exactly the bytes written to the result file
+        with open(result["result_file"], "rb") as f:
+            self.assertEqual(result["hash"], hashlib.sha256(f.read()).hexdigest())
+        
+    @patch.dict(os.environ, {"CLICKHOUSE_DISABLE_TMP_FILES": "true"})
+    def test_run_clickhouse_query_tmp_files_disabled(self):
+        """Test that inline-only queries are capped server-side and write no file."""
+        mock_result = query_result([["value1"], ["value2"]], ["column1"], query_id="inline_query_id")
+        self.mock_client.query.return_value = mock_result
+
+        with patch('builtins.open', mock.mock_open()) as mock_file:
+            result = run_clickhouse_query("SELECT * FROM test_table", inline_result_limit_bytes=100)
+
+        mock_file.assert_not_called()
+        self.assertNotIn("result_file", result)
+        self.assertNotIn("hash", result)
+        self.assertEqual(result["result_rows"], [["value1"], ["value2"]])
+        self.mock_client.query.assert_called_once_with("SELECT * FROM test_table", settings={
+            "max_result_bytes": 100 * 64,
+            "result_overflow_mode": "break",
+        })
+
+    @patch.dict(os.environ, {"CLICKHOUSE_DISABLE_TMP_FILES": "true"})
+    def test_run_clickhouse_query_skips_encoding_oversized_rows(self):
+        """Test that rows which cannot fit inline are not encoded without a result file."""
+        mock_result = query_result([("small",), ("x" * 5000, [1, 2, 3]), ("small",)], ["column1"], query_id="inline_query_id")
+        self.mock_client.query.return_value = mock_result
+
+        with patch.object(mcp_server, "dumps_json_bytes", wraps=mcp_server.dumps_json_bytes) as mock_dumps:
+            result = run_clickhouse_query("SELECT * FROM test_table", inline_result_limit_bytes=100)
+
+        mock_dumps.assert_called_once_with(("small",))
+        self.assertEqual(result["result_rows"], [["small"]])
+        self.assertIn("warning", result)
+
+    def test_min_row_json_size_is_lower_bound(self):
+        """Test that the cheap row size estimate never exceeds the real size."""
+        rows = [(), ("",), ("abc", 1, None), ("é\n\"", [1, [2, 3]], []), (1.5, True, ("a", "b"))]
+        for row in rows:
+            self.assertLessEqual(mcp_server.min_row_json_size(row), len(mcp_server.dumps_json_bytes(row)))
+
     def test_run_clickhouse_query_with_performance_metrics(self):
         """Test running a query with performance measurement enabled."""
         # Setup mock return values
-        mock_query_result = MagicMock()
-        mock_query_result.result_rows = [{"column1": "value1"}]
-        mock_query_result.column_names = ["column1"]
-        
-        mock_perf_result = MagicMock()
-        mock_perf_result.result_rows = [(
+        mock_query_result = query_result(
+            [{"column1": "value1"}], ["column1"], query_id="server_generated_query_id_12345")
+
+        mock_perf_result = query_result([(
             "2025-03-27 10:00:00",  # event_time
             150,                    # query_duration_ms
             2048                    # memory_usage
-        )]
-        
-        # Add query_id attribute to mock_query_result
-        mock_query_result.query_id = "server_generated_query_id_12345"
+        )])
         
         # Configure the mock to return different results for different queries
         def mock_query_side_effect(query):
@@ -112,8 +273,8 @@ class TestClickhouseQuery(unittest.TestCase):
         self.mock_client.query.side_effect = mock_query_side_effect
         
         # Use patch to avoid actual file operations
-        with patch('builtins.open', mock.mock_open()), \
-             patch('time.sleep'):  # Patch sleep to avoid delays
+        with patch('builtins.open', return_value=FakeFile()), \
+             patch('time.sleep') as mock_sleep:  # Patch sleep to avoid delays
             
             result = run_clickhouse_query("SELECT * FROM test_table", measure_performance=True)
         
@@ -128,22 +289,74 @@ class TestClickhouseQuery(unittest.TestCase):
                      str(self.mock_client.query.call_args_list[1]))
         self.assertEqual(self.mock_client.query.call_count, 2)  # Original query + query_log query
         
+        # query_log is flushed up front, so the first poll finds the entry without waiting
+        self.mock_client.command.assert_called_once_with("SYSTEM FLUSH LOGS")
+        mock_sleep.assert_not_called()
+        
         # Check that performance data is included
         self.assertIn("performance", result)
         self.assertEqual(result["performance"]["duration_ms"], 150)
         self.assertEqual(result["performance"]["memory_usage"], 2048)
 
+    def test_run_clickhouse_query_performance_without_flush_grant(self):
+        """Test that query_log is polled after a short wait when it can't be flushed."""
+        mock_query_result = query_result([["value1"]], ["column1"], query_id="no_flush_query_id")
+        mock_perf_result = query_result([("2025-03-27 10:00:00", 150, 2048)])
+        self.mock_client.query.side_effect = lambda query: (
+            mock_perf_result if "system.query_log" in query else mock_query_result)
+        self.mock_client.command.side_effect = Exception("Not enough privileges")
+
+        with patch('builtins.open', return_value=FakeFile()), \
+             patch('time.sleep') as mock_sleep:
+            result = run_clickhouse_query("SELECT * FROM test_table", measure_performance=True)
+
+        mock_sleep.assert_called_once_with(0.25)
+        self.assertEqual(result["performance"], {"duration_ms": 150, "memory_usage": 2048})
+
+    def test_run_clickhouse_query_performance_wait_without_flush_grant_is_bounded(self):
+        """Test that polling for a missing query_log entry stops after a short wait without the flush grant."""
+        mock_query_result = query_result([["value1"]], ["column1"], query_id="no_flush_query_id")
+        self.mock_client.query.side_effect = lambda query: (
+            query_result([]) if "system.query_log" in query else mock_query_result)
+        self.mock_client.command.side_effect = Exception("Not enough privileges")
+
+        with patch('builtins.open', return_value=FakeFile()), \
+             patch('time.sleep') as mock_sleep:
+            result = run_clickhouse_query("SELECT * FROM test_table", measure_performance=True)
+
+        waited = sum(call.args[0] for call in mock_sleep.call_args_list)
+        self.assertAlmostEqual(waited, mcp_server.PERFORMANCE_WAIT_NO_FLUSH_SECONDS)
+        self.assertEqual(result["performance_error"], "Performance data search timed out")
+
+    def test_run_clickhouse_query_performance_error_kept(self):
+        """Test that a failed query_log lookup reports its error rather than a timeout."""
+        mock_query_result = query_result([["value1"]], ["column1"], query_id="perf_error_query_id")
+
+        def mock_query_side_effect(query):
+            if "system.query_log" in query:
+                raise Exception("Not enough privileges to read system.query_log")
+            return mock_query_result
+
+        self.mock_client.query.side_effect = mock_query_side_effect
+
+        with patch('builtins.open', return_value=FakeFile()), \
+             patch('time.sleep'):
+            result = run_clickhouse_query("SELECT * FROM test_table", measure_performance=True)
+
+        self.assertEqual(
+            result["performance_error"],
+            "Failed to retrieve performance data: Not enough privileges to read system.query_log")
+
     def test_get_clickhouse_schema(self):
         """Test getting a table schema."""
         # Setup mock return values for both queries
-        mock_describe_result = MagicMock()
-        mock_describe_result.result_rows = [
+        mock_describe_result = query_result([
             ["id", "UInt32", "", "", "", "", ""],
             ["name", "String", "", "", "", "", ""]
-        ]
+        ])
         
-        mock_create_result = MagicMock()
-        mock_create_result.result_rows = [["CREATE TABLE test_table (id UInt32, name String) ENGINE = MergeTree"]]
+        mock_create_result = query_result(
+            [["CREATE TABLE test_table (id UInt32, name String) ENGINE = MergeTree"]])
         
         # Set up the mock to return different results for different queries
         def mock_query_side_effect(query):
@@ -151,7 +364,7 @@ class TestClickhouseQuery(unittest.TestCase):
                 return mock_describe_result
             elif "SHOW CREATE TABLE" in query:
                 return mock_create_result
-            return MagicMock()
+            return query_result([])
         
         self.mock_client.query.side_effect = mock_query_side_effect
 
@@ -161,8 +374,10 @@ class TestClickhouseQuery(unittest.TestCase):
         # Parse the JSON result
         parsed_result = json.loads(result)
         
-        # Assertions
-        self.assertEqual(self.mock_client.query.call_count, 2)
+        # Assertions: both queries are issued (concurrently, so in any order)
+        self.assertCountEqual(
+            [call.args[0] for call in self.mock_client.query.call_args_list],
+            ["DESCRIBE TABLE test_table", "SHOW CREATE TABLE test_table"])
         self.assertEqual(len(parsed_result["columns"]), 2)
         self.assertEqual(parsed_result["columns"][0]["name"], "id")
         self.assertEqual(parsed_result["columns"][1]["type"], "String")
@@ -170,101 +385,48 @@ class TestClickhouseQuery(unittest.TestCase):
 
     def test_explain_clickhouse_query(self):
         """Test explaining a ClickHouse query."""
-        # Setup mock return value for default EXPLAIN
-        mock_default_result = MagicMock()
-        mock_default_result.result_rows = [["Expression (Projection)"], ["  ReadFromMergeTree"]]
-        mock_default_result.column_names = ["explain"]
-
-        # Setup mock return value for EXPLAIN PLAN
-        mock_plan_result = MagicMock()
-        mock_plan_result.result_rows = [["Plan with actions and indexes"]]
-        mock_plan_result.column_names = ["explain"]
-        
-        # Setup mock return value for EXPLAIN ESTIMATE
-        mock_estimate_result = MagicMock()
-        mock_estimate_result.result_rows = []
-        mock_estimate_result.column_names = ["database", "table", "parts", "rows", "marks"]
-        
-        # Setup mock return value for EXPLAIN PIPELINE
-        mock_pipeline_result = MagicMock() 
-        mock_pipeline_result.result_rows = [["Pipeline with graph=1"]]
-        mock_pipeline_result.column_names = ["explain"]
-        
-        # Configure mock to return different values based on query
-        def side_effect(query):
-            if "EXPLAIN ESTIMATE" in query:
-                return mock_estimate_result
-            elif "EXPLAIN PLAN" in query:
-                return mock_plan_result
-            elif "EXPLAIN PIPELINE" in query:
-                return mock_pipeline_result
-            elif query.startswith("EXPLAIN"):
-                return mock_default_result
-            return MagicMock()
-                
-        self.mock_client.query.side_effect = side_effect
+        query = "SELECT * FROM test_table"
+        default = f"EXPLAIN {query}"
+        plan = f"EXPLAIN PLAN actions=1, indexes=1 {query}"
+        pipeline = f"EXPLAIN PIPELINE graph=1 {query}"
+        estimate = f"EXPLAIN ESTIMATE {query}"
 
-        # Test 1: Call with default parameters
-        self.mock_client.query.reset_mock()
-        result = explain_clickhouse_query("SELECT * FROM test_table")
-        
-        # Verify basic explain functionality
-        self.assertIn("default_explain", result)
-        self.assertEqual(result["default_explain"], [["Expression (Projection)"], ["  ReadFromMergeTree"]])
-        self.assertNotIn("explain_estimate", result)  # Default is now False
-        self.assertNotIn("explain_plan", result)
-        self.assertNotIn("explain_pipeline", result)
-        
-        # Only default EXPLAIN call should be made
-        self.assertEqual(len(self.mock_client.query.call_args_list), 1)
-        self.assertEqual(self.mock_client.query.call_args_list[0][0][0], "EXPLAIN SELECT * FROM test_table")
-        
-        # Test 2: Enable EXPLAIN ESTIMATE 
-        self.mock_client.query.reset_mock()
-        result = explain_clickhouse_query("SELECT * FROM test_table", explain_estimate=True)
-        
-        # Verify both default and estimate are included
-        self.assertIn("default_explain", result) 
-        self.assertIn("explain_estimate", result)
-        self.assertEqual(result["explain_estimate"]["columns"], ["database", "table", "parts", "rows", "marks"])
-        
-        # Both calls should be made
-        self.assertEqual(len(self.mock_client.query.call_args_list), 2)
-        self.assertEqual(self.mock_client.query.call_args_list[0][0][0], "EXPLAIN SELECT * FROM test_table")
-        self.assertEqual(self.mock_client.query.call_args_list[1][0][0], "EXPLAIN ESTIMATE SELECT * FROM test_table")
-        
-        # Test 3: Enable EXPLAIN PLAN
-        self.mock_client.query.reset_mock()
-        result = explain_clickhouse_query("SELECT * FROM test_table", explain_plan=True)
-        
-        # Verify both default and plan are included
-        self.assertIn("default_explain", result)
-        self.assertIn("explain_plan", result)
-        self.assertNotIn("explain_estimate", result)  # Should not be present with default settings
-        
-        # Both calls should be made
-        self.assertEqual(len(self.mock_client.query.call_args_list), 2)
-        self.assertEqual(self.mock_client.query.call_args_list[0][0][0], "EXPLAIN SELECT * FROM test_table")
-        self.assertEqual(self.mock_client.query.call_args_list[1][0][0], "EXPLAIN PLAN actions=1, indexes=1 SELECT * FROM test_table")
-        
-        # Test 4: Enable all explain types
-        self.mock_client.query.reset_mock()
-        result = explain_clickhouse_query("SELECT * FROM test_table", explain_plan=True, explain_pipeline=True, explain_estimate=True)
-        
-        # Verify all types are included
-        self.assertIn("default_explain", result)
-        self.assertIn("explain_plan", result)
-        self.assertIn("explain_pipeline", result)
-        self.assertIn("explain_estimate", result)
-        
-        # All four calls should be made
-        self.assertEqual(len(self.mock_client.query.call_args_list), 4)
+        # Mock results keyed by the exact SQL, so any other query fails the test
+        explain_responses = {
+            default: query_result([["Expression (Projection)"], ["  ReadFromMergeTree"]], ["explain"]),
+            plan: query_result([["Plan with actions and indexes"]], ["explain"]),
+            pipeline: query_result([["Pipeline with graph=1"]], ["explain"]),
+            estimate: query_result([], ["database", "table", "parts", "rows", "marks"]),
+        }
+        self.mock_client.query.side_effect = explain_responses.__getitem__
+
+        # (options, expected result keys in order, expected EXPLAIN queries).
+        # Explain queries run concurrently, so they may be issued in any order,
+        # but results keep the order of the explain types
+        cases = [
+            ({}, ["default_explain"], [default]),
+            ({"explain_estimate": True}, ["default_explain", "explain_estimate"], [default, estimate]),
+            ({"explain_plan": True}, ["default_explain", "explain_plan"], [default, plan]),
+            ({"explain_plan": True, "explain_pipeline": True, "explain_estimate": True},
+             ["default_explain", "explain_plan", "explain_pipeline", "explain_estimate"],
+             [default, plan, pipeline, estimate]),
+        ]
+        for options, expected_keys, expected_queries in cases:
+            with self.subTest(**options):
+                self.mock_client.query.reset_mock()
+                result = explain_clickhouse_query(query, **options)
+
+                self.assertEqual(list(result), expected_keys)
+                self.assertCountEqual(
+                    [call.args[0] for call in self.mock_client.query.call_args_list], expected_queries)
+                self.assertEqual(result["default_explain"], [["Expression (Projection)"], ["  ReadFromMergeTree"]])
+                if "explain_estimate" in result:
+                    self.assertEqual(result["explain_estimate"]["columns"], ["database", "table", "parts", "rows", "marks"])
 
     def test_get_clickhouse_tables(self):
         """Test getting the list of tables."""
         # Setup mock return value
-        mock_result = MagicMock()
-        mock_result.result_rows = [{"name": "table1"}, {"name": "table2"}]
+        mock_result = query_result([{"name": "table1"}, {"name": "table2"}])
         self.mock_client.query.return_value = mock_result
 
         # Call the function
@@ -279,6 +441,162 @@ class TestClickhouseQuery(unittest.TestCase):
         self.assertEqual(parsed_result[0]["name"], "table1")
         self.assertEqual(parsed_result[1]["name"], "table2")
 
+    def test_get_query_execution_stats_binds_parameters(self):
+        """Test that execution stats values are bound as query parameters."""
+        mock_result = query_result([[100, 200, 100, 1024, 2048, 1024, 2, "my_query"]], ["realTimeMSAvg"])
+        self.mock_client.query.return_value = mock_result
+
+        get_query_execution_stats(24, limit=5, query_name="my_query' OR 1=1")
+        sql, = self.mock_client.query.call_args.args
+        parameters = self.mock_client.query.call_args.kwargs["parameters"]
+
+        self.assertNotIn("my_query", sql)
+        self.assertIn("{query_name_pattern:String}", sql)
+        self.assertEqual(parameters, {
+            "last_x_hours": 24,
+            "limit": 5,
+            "query_name_pattern": "%my_query' OR 1=1%",
+        })
+
+        # Without a name filter the query text stays the same
+        get_query_execution_stats(1)
+        self.assertEqual(self.mock_client.query.call_args.args[0], sql)
+        self.assertEqual(self.mock_client.query.call_args.kwargs["parameters"]["query_name_pattern"], "%")
+
+    def test_get_query_details(self):
+        """Test fetching a query with its params and performance samples."""
+        fetch_threads = []
+
+        def fake_get(url, headers=None):
+            fetch_threads.append(threading.current_thread().name)
+            response = MagicMock()
+            response.status_code = 200
+            response.headers = {"ETag": '"v1"'}
+            response.text = "SELECT 1\\nFROM t" if url.endswith("query.sql") else '{"limit": "Int64"}'
+            return response
+
+        mock_perf_result = query_result([("2025-03-27 10:00:00", "my_query-id", 150, 2048, "SELECT 1")])
+        self.mock_client.query.return_value = mock_perf_result
+
+        with patch.object(mcp_server, "get_http_session") as mock_session:
+            mock_session.return_value.get.side_effect = fake_get
+            result = json.loads(get_query_details("my_query"))
+
+        self.assertEqual(mock_session.return_value.get.call_count, 2)
+        # GitHub downloads don't take up the ClickHouse query workers
+        self.assertTrue(all(name.startswith("github-fetch") for name in fetch_threads), fetch_threads)
+        self.assertEqual(result["query"], "SELECT 1\nFROM t")
+        self.assertEqual(result["params"], {"limit": "Int64"})
+        self.assertEqual(result["performance_samples"][0]["query_duration_ms"], 150)
+        self.assertEqual(self.mock_client.query.call_args.kwargs["parameters"],
+                         {"query_name": "my_query", "samples": 1})
+        self.assertNotIn("error", result)
+
+    def test_get_query_details_failed_fetch_leaves_nothing_running(self):
+        """Test that a failed query download doesn't leave lookups running after the tool returns."""
+        started = threading.Event()
+        finished = threading.Event()
+
+        def slow_query(*args, **kwargs):
+            started.set()
+            time.sleep(0.2)
+            finished.set()
+            return query_result([])
+
+        self.mock_client.query.side_effect = slow_query
+        with patch.object(mcp_server, "fetch_github_text", side_effect=RuntimeError("rate limited")):
+            result = json.loads(get_query_details("my_query"))
+
+        self.assertIn("Failed to get query", result["error"])
+        # The performance query was either cancelled or waited for
+        self.assertEqual(started.is_set(), finished.is_set())
+
+    def test_github_downloads_cached_and_revalidated(self):
+        """Test that GitHub files are cached and revalidated with their ETag."""
+        url = "https://raw.githubusercontent.com/example/query.sql"
+        ok = MagicMock(status_code=200, headers={"ETag": '"v1"'}, text="SELECT 1")
+        not_modified = MagicMock(status_code=304, headers={}, text="")
+
+        with patch.object(mcp_server, "get_http_session") as mock_session:
+            mock_session.return_value.get.side_effect = [ok, not_modified]
+
+            self.assertEqual(mcp_server.fetch_github_text(url), "SELECT 1")
+            # Fresh entries are served without a request
+            self.assertEqual(mcp_server.fetch_github_text(url), "SELECT 1")
+            self.assertEqual(mock_session.return_value.get.call_count, 1)
+
+            # Stale entries are revalidated, and a 304 keeps the cached text
+            with patch.object(mcp_server, "GITHUB_CACHE_TTL", 0):
+                self.assertEqual(mcp_server.fetch_github_text(url), "SELECT 1")
+            self.assertEqual(mock_session.return_value.get.call_args.kwargs["headers"],
+                             {"If-None-Match": '"v1"'})
+
+    def test_github_download_errors(self):
+        """Test that error responses are never returned as the file content."""
+        url = "https://raw.githubusercontent.com/example/query.sql"
+        ok = MagicMock(status_code=200, headers={"ETag": '"v1"'}, text="SELECT 1")
+        rate_limited = MagicMock(status_code=403, headers={}, text="rate limit exceeded")
+        not_found = requests.Response()
+        not_found.status_code = 404
+        not_found.reason = "Not Found"
+        not_found.url = url
+
+        with patch.object(mcp_server, "get_http_session") as mock_session:
+            # Without a cached copy the error is raised
+            mock_session.return_value.get.side_effect = [not_found]
+            with self.assertRaises(requests.HTTPError):
+                mcp_server.fetch_github_text(url)
+
+            # A stale cached copy is kept when revalidation fails
+            mock_session.return_value.get.side_effect = [ok, rate_limited, rate_limited]
+            self.assertEqual(mcp_server.fetch_github_text(url), "SELECT 1")
+            with patch.object(mcp_server, "GITHUB_CACHE_TTL", 0):
+                self.assertEqual(mcp_server.fetch_github_text(url), "SELECT 1")
+                # The failure isn't cached, so the next call retries
+                self.assertEqual(mcp_server.fetch_github_text(url), "SELECT 1")
+            self.assertEqual(mock_session.return_value.get.call_count, 4)
+
+    def test_get_clickhouse_tables_all_databases(self):
+        """Test listing tables from all databases."""
+        def side_effect(query):
+            mock_result = query_result([] if query.endswith("misc") else [[query.split()[-1] + "_table"]])
+            return mock_result
+
+        self.mock_client.query.side_effect = side_effect
+
+        result = json.loads(get_clickhouse_tables(databases="all"))
+
+        self.assertCountEqual(
+            [call[0][0] for call in self.mock_client.query.call_args_list],
+            ["SHOW TABLES FROM default", "SHOW TABLES FROM benchmark", "SHOW TABLES FROM misc"])
+        self.assertEqual(result, {
+            "default": [["default_table"]],
+            "benchmark": [["benchmark_table"]],
+            "misc": [],
+        })
+
+    def test_get_clickhouse_tables_cached(self):
+        """Test that repeated table lookups are served from the cache."""
+        mock_result = query_result([{"name": "table1"}])
+        self.mock_client.query.return_value = mock_result
+
+        first = get_clickhouse_tables()
+        second = get_clickhouse_tables()
+
+        self.assertEqual(first, second)
+        self.mock_client.query.assert_called_once_with("SHOW TABLES FROM default")
+
+        # A different database is a separate cache entry
+        get_clickhouse_tables(database="benchmark")
+        self.assertEqual(self.mock_client.query.call_count, 2)
+
+        # Errors are not cached
+        self.mock_client.query.side_effect = Exception("boom")
+        self.assertTrue(get_clickhouse_tables(database="misc").startswith("Error:"))
+        self.mock_client.query.side_effect = None
+        get_clickhouse_tables(database="misc")
+        self.assertEqual(self.mock_client.query.call_count, 4)
+
     @skipUnless(os.getenv("CLICKHOUSE_HOST") and os.getenv("CLICKHOUSE_PORT"),
                 reason="Skipping integration test as ClickHouse connection parameters are not set in environment variables.")
     def test_integration_run_clickhouse_query(self):
@@ -290,38 +608,117 @@ class TestClickhouseQuery(unittest.TestCase):
         - CLICKHOUSE_USER
         - CLICKHOUSE_PASSWORD
         """
-        # Remove the patch for this test to use the real client
-        self.client_patcher.stop()
-        
-        try:
-            # Run a simple test query that should work on any ClickHouse instance
-            result = run_clickhouse_query("SELECT 1 AS test")
+        # Use the real client for this test; the class patch is restored on exit
+        with patch('clickhouse_mcp.mcp_server.get_clickhouse_client', get_clickhouse_client):
+            try:
+                # Run a simple test query that should work on any ClickHouse instance
+                result = run_clickhouse_query("SELECT 1 AS test")
             
-            # Check that a file was created
-            self.assertIsInstance(result, dict)
-            self.assertTrue("result_file" in result)
-            self.assertTrue(os.path.exists(result["result_file"]))
+                # Check that a file was created
+                self.assertIsInstance(result, dict)
+                self.assertTrue("result_file" in result)
+                self.assertTrue(os.path.exists(result["result_file"]))
             
-            # Read the file content
-            with open(result["result_file"], 'r') as f:
-                content = f.read()
+                # Read the file content
+                with open(result["result_file"], 'r') as f:
+                    content = f.read()
             
-            # Parse JSON and verify the response
-            data = json.loads(content)
-            self.assertEqual(len(data), 1)
-            self.assertEqual(data[0][0], 1)  # First row, first column should be 1
+                # Parse JSON and verify the response
+                data = json.loads(content)
+                self.assertEqual(len(data), 1)
+                self.assertEqual(data[0][0], 1)  # First row, first column should be 1
             
-            # Clean up the file
-            os.remove(result["result_file"])
-            
-        except Exception as e:
-            print(f"Integration test failed: {e}")
-            raise
-        finally:
-            # Restart the patch for other tests
-            self.mock_get_client = self.client_patcher.start()
-            self.mock_client = MagicMock()
-            self.mock_get_client.return_value = self.mock_client
+                # Clean up the file
+                os.remove(result["result_file"])
+
+            except Exception as e:
+                print(f"Integration test failed: {e}")
+                raise
+
+    def test_warm_vector_store_logs_errors(self):
+        """Test that the background vector store warm-up logs load failures."""
+        with patch.object(mcp_server, "get_vector_store", side_effect=FileNotFoundError("no index")) as mock_get, \
+                self.assertLogs(mcp_server.logger, level="WARNING") as logs:
+            thread = mcp_server.warm_vector_store()
+            thread.join(timeout=5)
+
+        mock_get.assert_called_once_with()
+        self.assertIn("Failed to preload the vector store", logs.output[0])
+        self.assertIn("FileNotFoundError: no index", logs.output[0])
+        self.assertTrue(thread.daemon)
+        self.assertFalse(thread.is_alive())
+
+
+class TestClickhouseClient(unittest.TestCase):
+    @patch.dict(os.environ, {
+        "CLICKHOUSE_HOST": "localhost",
+        "CLICKHOUSE_PORT": "8443",
+        "CLICKHOUSE_USER": "user",
+        "CLICKHOUSE_PASSWORD": "password",
+    })
+    @patch('clickhouse_connect.get_client')
+    def test_client_per_thread_with_shared_pool(self, mock_get_client):
+        """Test that each thread gets its own client and all clients share one pool."""
+        mock_get_client.side_effect = lambda **kwargs: MagicMock()
+
+        with patch.object(mcp_server, "_client_local", threading.local()):
+            client = get_clickhouse_client()
+            self.assertIs(get_clickhouse_client(), client)
+
+            other = []
+            thread = threading.Thread(target=lambda: other.append(get_clickhouse_client()))
+            thread.start()
+            thread.join()
+
+        self.assertIsNot(other[0], client)
+        self.assertEqual(mock_get_client.call_count, 2)
+        pools = [call.kwargs["pool_mgr"] for call in mock_get_client.call_args_list]
+        self.assertIs(pools[0], pools[1])
+
+    @patch.dict(os.environ, {
+        "CLICKHOUSE_HOST": "localhost",
+        "CLICKHOUSE_PORT": "8443",
+        "CLICKHOUSE_USER": "user",
+        "CLICKHOUSE_PASSWORD": "password",
+    })
+    @patch('clickhouse_connect.get_client')
+    def test_concurrent_queries_reuse_calling_thread_client(self, mock_get_client):
+        """Test that the client created to check the configuration runs the first query."""
+        mock_get_client.side_effect = lambda **kwargs: MagicMock()
+        clear_metadata_cache()
+
+        with patch.object(mcp_server, "_client_local", threading.local()):
+            get_clickhouse_schema("test_table")
+            client = get_clickhouse_client()
+
+        clear_metadata_cache()
+        client.query.assert_called_once_with("DESCRIBE TABLE test_table")
+        # One client for this thread and one for the worker, none unused
+        self.assertEqual(mock_get_client.call_count, 2)
+
+    def test_query_executor_sized_by_pool_size(self):
+        """Test that the shared query workers match CLICKHOUSE_POOL_SIZE."""
+        with patch.object(mcp_server, "_query_executor", None), \
+                patch.dict(os.environ, {"CLICKHOUSE_POOL_SIZE": "7"}):
+            executor = mcp_server.get_query_executor()
+            try:
+                self.assertIs(mcp_server.get_query_executor(), executor)
+                self.assertEqual(executor._max_workers, 7)
+            finally:
+                executor.shutdown()
+
+    def test_pool_size_from_environment(self):
+        """Test that CLICKHOUSE_POOL_SIZE controls the connection pool size."""
+        with patch.dict(os.environ, {"CLICKHOUSE_POOL_SIZE": "4"}):
+            self.assertEqual(mcp_server.get_pool_size(), 4)
+
+        with patch.dict(os.environ, {"CLICKHOUSE_POOL_SIZE": ""}):
+            self.assertEqual(mcp_server.get_pool_size(), os.cpu_count() or 1)
+
+        for invalid in ("0", "many"):
+            with patch.dict(os.environ, {"CLICKHOUSE_POOL_SIZE": invalid}):
+                with self.assertRaises(ValueError):
+                    mcp_server.get_pool_size()
 
 
 class TestClickhouseLinter(unittest.TestCase):
@@ -335,13 +732,10 @@ class TestClickhouseLinter(unittest.TestCase):
     def test_valid_query(self):
         """Test linting a valid query."""
         query = "SELECT column1, column2 FROM table WHERE condition = 1 ORDER BY column1"
-        with patch('sqlfluff.lint') as mock_lint, patch('sqlfluff.fix') as mock_fix:
+        with patch('clickhouse_mcp.mcp_server.sqlfluff_lint_fix') as mock_lint_fix:
             
-            # Mock the lint result
-            mock_lint.return_value = []  # No violations
-            
-            # Mock the fix result - same as input for valid query
-            mock_fix.return_value = {"fix_str": query}
+            # No violations, and the fix is the same as the input for a valid query
+            mock_lint_fix.return_value = ([], query)
             
             result = lint_clickhouse_query(query)
             
@@ -354,30 +748,31 @@ class TestClickhouseLinter(unittest.TestCase):
     def test_invalid_query(self):
         """Test linting an invalid query with formatting issues."""
         query = "SELECT    column1,column2     FROM table where CONDITION=1 order by column1"
-        with patch('sqlfluff.lint') as mock_lint, patch('sqlfluff.fix') as mock_fix:
-            
-            # Create mock violations
-            mock_violation1 = MagicMock()
-            mock_violation1.rule_code.return_value = "L001"
-            mock_violation1.description.return_value = "Unnecessary whitespace"
-            mock_violation1.line_no = 1
-            mock_violation1.line_pos = 5
-            mock_violation1.line_str = "SELECT    column1"
+        with patch('clickhouse_mcp.mcp_server.sqlfluff_lint_fix') as mock_lint_fix:
             
-            mock_violation2 = MagicMock()
-            mock_violation2.rule_code.return_value = "L010"
-            mock_violation2.description.return_value = "Keywords must be capitalized"
-            mock_violation2.line_no = 1
-            mock_violation2.line_pos = 30
-            mock_violation2.line_str = "FROM table where"
+            # Create mock violations, as returned by the sqlfluff simple API
+            mock_violation1 = {
+                "code": "L001",
+                "description": "Unnecessary whitespace",
+                "start_line_no": 1,
+                "start_line_pos": 5,
+            }
             
-            mock_lint.return_value = [mock_violation1, mock_violation2]
+            mock_violation2 = {
+                "code": "L010",
+                "description": "Keywords must be capitalized",
+                "start_line_no": 1,
+                "start_line_pos": 30,
+            }
             
-            # Mock the fix result
+            # Violations and the fixed query come from the same lint
             formatted = "SELECT column1, column2 FROM table WHERE condition = 1 ORDER BY column1"
-            mock_fix.return_value = {"fix_str": formatted}
+            mock_lint_fix.return_value = ([mock_violation1, mock_violation2], formatted)
             
-            result = lint_clickhouse_query(query)
+            result = lint_clickhouse_query(query, rule_exclude="LT05, CP02")
+            
+            # The query string itself is linted, not a temporary file
+            mock_lint_fix.assert_called_once_with(query, ["LT05", "CP02"])
             
             # Should be a failing result with violations
             self.assertEqual(result["status"], "fail")
@@ -386,7 +781,25 @@ class TestClickhouseLinter(unittest.TestCase):
             self.assertEqual(result["formatted_query"], formatted)
             self.assertEqual(result["errors"][0]["rule"], "L001")
             self.assertEqual(result["errors"][1]["rule"], "L010")
-    
-    
+            self.assertEqual(result["errors"][0]["position"], 5)
+            self.assertEqual(result["errors"][0]["context"], query)
+
+    def test_linter_built_once_per_rule_set(self):
+        """Test that real lints reuse one cached SQLFluff linter per set of excluded rules."""
+        mcp_server.get_sqlfluff_linter.cache_clear()
+        query = "select a,b from t"
+
+        first = lint_clickhouse_query(query, rule_exclude="LT05,CP02")
+        second = lint_clickhouse_query(query, rule_exclude=" CP02 , LT05")
+
+        cache_info = mcp_server.get_sqlfluff_linter.cache_info()
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(cache_info.hits, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first["status"], "fail")
+        self.assertNotIn("CP02", [error["rule"] for error in first["errors"]])
+        self.assertEqual(first["formatted_query"], "select\n    a,\n    b\nfrom t\n")
+
+
 if __name__ == "__main__":
     unittest.main()
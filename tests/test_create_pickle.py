@@ -2,7 +2,6 @@
 
 import os
 import sys
-import pickle
 from pathlib import Path
 
 # Add the tools directory to the path so we can import chunk_md
@@ -47,8 +46,7 @@ def create_test_pickle():
     
     # Save to pickle file
     pickle_path = chunk_md.get_default_output_path()
-    with open(pickle_path, 'wb') as f:
-        pickle.dump(all_chunks, f)
+    chunk_md.save_chunks_to_pickle(all_chunks, str(pickle_path))
     
     print(f"Created pickle file at {pickle_path} with {len(all_chunks)} chunks")
 
@@ -0,0 +1,95 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from clickhouse_mcp.docs_search import load_chunks, simple_search
+
+
+def make_chunk(path, content, document_title, section_title, **metadata):
+    """Build a document chunk shaped like the ones in the chunks pickle."""
+    return {
+        "content": content,
+        "metadata": {
+            "document_title": document_title,
+            "section_title": section_title,
+            "path": path,
+            **metadata,
+        },
+    }
+
+
+CHUNKS = [
+    make_chunk("select.md", "SELECT rows FROM a table. Use SELECT with WHERE to filter rows.",
+               "Select queries", "Basics"),
+    make_chunk("mergetree.md", "The MergeTree engine stores rows in parts. MergeTree parts are merged in the background.",
+               "MergeTree", "Parts", level=2),
+    make_chunk("insert.md", "Insert rows into a table with INSERT INTO.",
+               "Insert", "Insert rows into a table"),
+    # Has every word of "select rows", but not the phrase
+    make_chunk("order.md", "Rows select: every select reads rows.",
+               "Reading data", "Select rows"),
+    make_chunk("other.md", "Nothing relevant here.",
+               "Settings", "Server", level=1),
+]
+
+# Expected rankings (by path), as scored before the search was optimized
+EXPECTED_RANKINGS = {
+    # Multi-word queries: word counts, the phrase bonus and metadata matches
+    "select rows": ["select.md", "order.md", "insert.md", "mergetree.md"],
+    "SELECT ROWS": ["select.md", "order.md", "insert.md", "mergetree.md"],
+    "merge parts": ["mergetree.md"],
+    "nothing at all": ["other.md"],
+    # Single-word queries
+    "mergetree": ["mergetree.md"],
+    "rows": ["order.md", "insert.md", "select.md", "mergetree.md"],
+    # Words of two characters or less only count as part of the phrase
+    "to a table": ["insert.md", "select.md"],
+    "in": ["insert.md", "other.md", "mergetree.md", "order.md"],
+    # Equal scores keep the chunk order
+    "a": ["select.md", "mergetree.md", "insert.md", "order.md", "other.md"],
+}
+
+
+class TestSimpleSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Load the chunks the way the tools do, so they carry the lowercased
+        # fields cached by load_chunks
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pickle_path = os.path.join(tmp_dir, "chunks.pkl")
+            with open(pickle_path, "wb") as f:
+                pickle.dump(CHUNKS, f)
+            cls.loaded_chunks = load_chunks(pickle_path)
+
+    def assertRanking(self, chunks, query, num_results, expected):
+        results = simple_search(chunks, query, num_results)
+        self.assertEqual([chunk["metadata"]["path"] for chunk in results], expected)
+
+    def test_loaded_chunks_have_search_cache(self):
+        """Test that load_chunks caches the lowercased content and metadata."""
+        chunk = self.loaded_chunks[1]
+        self.assertEqual(chunk["_content_lower"], CHUNKS[1]["content"].lower())
+        self.assertEqual(chunk["_metadata_lower"], ["mergetree", "parts", "mergetree.md"])
+
+    def test_rankings(self):
+        """Test rankings for chunks with and without the cached lowercase fields."""
+        for chunks, label in ((CHUNKS, "plain"), (self.loaded_chunks, "cached")):
+            for query, expected in EXPECTED_RANKINGS.items():
+                with self.subTest(chunks=label, query=query):
+                    self.assertRanking(chunks, query, 5, expected)
+
+    def test_top_results_limited(self):
+        """Test that only the best num_results chunks are returned, in rank order."""
+        for chunks in (CHUNKS, self.loaded_chunks):
+            self.assertRanking(chunks, "rows", 2, ["order.md", "insert.md"])
+            self.assertRanking(chunks, "a", 3, ["select.md", "mergetree.md", "insert.md"])
+
+    def test_no_matches(self):
+        """Test that chunks without any match are not returned."""
+        self.assertEqual(simple_search(CHUNKS, "replication"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
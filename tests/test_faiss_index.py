@@ -21,7 +21,10 @@ from unittest import skipUnless
 # Add the parent directory to sys.path to allow importing the module
 sys.path.append(str(Path(__file__).parent.parent))
 from src.clickhouse_mcp.docs_search import load_chunks
-from src.clickhouse_mcp.vector_search import create_faiss_index, load_faiss_index, vector_search
+from src.clickhouse_mcp.vector_search import (
+    IVF_MIN_NPROBE, IVF_MIN_RECALL, build_ivf_index, create_faiss_index, embed_texts,
+    ivf_recall, load_faiss_index, partition_index, vector_search
+)
 from src.clickhouse_mcp import DEFAULT_BEDROCK_MODEL, DEFAULT_REGION
 
 class TestFaissIndex(unittest.TestCase):
@@ -74,6 +77,80 @@ class TestFaissIndex(unittest.TestCase):
         # Clean up
         shutil.rmtree(test_index_path)
 
+    def test_embed_texts_keeps_order(self):
+        """Test that batches embedded concurrently come back in text order."""
+        class LengthEmbeddings:
+            def __init__(self):
+                self.batch_sizes = []
+
+            def embed_documents(self, texts):
+                self.batch_sizes.append(len(texts))
+                return [[float(len(text))] for text in texts]
+
+        texts = ["x" * i for i in range(25)]
+        embeddings = LengthEmbeddings()
+        vectors = embed_texts(texts, embeddings, batch_size=10, max_workers=3)
+
+        self.assertEqual(vectors, [[float(i)] for i in range(25)])
+        self.assertEqual(sorted(embeddings.batch_sizes), [5, 10, 10])
+        self.assertEqual(embed_texts([], embeddings), [])
+
+    def test_build_ivf_index(self):
+        """Test converting a flat index into an IVF index with the same vectors."""
+        import faiss
+        import numpy as np
+
+        vectors = np.random.RandomState(0).rand(2000, 16).astype("float32")
+        flat = faiss.IndexFlatL2(16)
+        flat.add(vectors)
+
+        ivf = build_ivf_index(flat, nprobe=4)
+        self.assertEqual(ivf.ntotal, 2000)
+        self.assertEqual(ivf.nprobe, 4)
+        self.assertEqual(ivf.nlist, 2000 // 39)
+
+        # Every vector is still found as its own nearest neighbour
+        _, ids = ivf.search(vectors[:20], 1)
+        self.assertEqual(ids[:, 0].tolist(), list(range(20)))
+
+        # By default a share of the lists is scanned, never fewer than the floor
+        self.assertEqual(build_ivf_index(flat).nprobe, min(IVF_MIN_NPROBE, 2000 // 39))
+
+    def test_ivf_recall_against_flat(self):
+        """Test that an automatic IVF index finds the same neighbours as exact search."""
+        import faiss
+        import numpy as np
+
+        # Clustered vectors, like document embeddings
+        random_state = np.random.RandomState(0)
+        centers = random_state.randn(200, 32).astype("float32") * 3
+        vectors = centers[random_state.randint(0, 200, 20000)] + random_state.randn(20000, 32).astype("float32")
+        flat = faiss.IndexFlatL2(32)
+        flat.add(vectors)
+
+        ivf = partition_index(flat)
+        self.assertIsInstance(ivf, faiss.IndexIVFFlat)
+        self.assertGreaterEqual(ivf_recall(flat, ivf), IVF_MIN_RECALL)
+
+        # Unseen queries near the data get the exact top 10 as well
+        queries = vectors[:100] + random_state.randn(100, 32).astype("float32") * 0.1
+        _, exact_ids = flat.search(queries, 10)
+        _, ivf_ids = ivf.search(queries, 10)
+        recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact_ids, ivf_ids)])
+        self.assertGreaterEqual(recall, IVF_MIN_RECALL)
+
+    def test_partition_index_keeps_flat_when_recall_too_low(self):
+        """Test that the flat index is kept when IVF can't reach the recall target."""
+        import faiss
+        import numpy as np
+
+        # Uniform random vectors have no cluster structure for IVF to use
+        vectors = np.random.RandomState(0).rand(20000, 64).astype("float32")
+        flat = faiss.IndexFlatL2(64)
+        flat.add(vectors)
+
+        self.assertIs(partition_index(flat), flat)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -2,13 +2,35 @@
 
 import os
 import re
-import yaml
-import pickle
 import argparse
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from clickhouse_mcp.docs_search import get_project_root
 
+# Precompiled patterns used on every processed file
+_FM_RE = re.compile(r'^---\s*\n(.*?)\n---\s*\n', re.DOTALL)
+_H1_RE = re.compile(r'# (.+?)(\n|$)')
+_H2_TITLE_RE = re.compile(r'^## ([^\n]+)')
+_H3_TITLE_RE = re.compile(r'^### ([^\n]+)')
+_PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_KEY_CLEAN_RE = re.compile(r'[^\w\s-]')
+
+
+@lru_cache(maxsize=1)
+def _get_yaml_safe_loader():
+    """Import yaml on first use, preferring the libyaml-backed safe loader."""
+    try:
+        from yaml import CSafeLoader as loader
+    except ImportError:
+        from yaml import SafeLoader as loader
+    return loader
+
+
 def extract_frontmatter(content: str) -> Tuple[Dict[str, Any], str]:
     """
     Extract YAML frontmatter from the content if present.
@@ -23,10 +45,12 @@ def extract_frontmatter(content: str) -> Tuple[Dict[str, Any], str]:
     content_without_frontmatter = content
     
     # Check for YAML frontmatter (between --- markers)
-    fm_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', content, re.DOTALL)
+    fm_match = _FM_RE.match(content)
     if fm_match:
+        import yaml
+        
         try:
-            frontmatter = yaml.safe_load(fm_match.group(1))
+            frontmatter = yaml.load(fm_match.group(1), Loader=_get_yaml_safe_loader())
             content_without_frontmatter = content[fm_match.end():]
         except Exception as e:
             print(f"Warning: Failed to parse frontmatter: {e}")
@@ -53,6 +77,37 @@ def get_docs_dir() -> Path:
     return docs_path
 
 
+def split_at_headers(content: str, marker: str) -> List[str]:
+    """
+    Split content at every line that starts with the given header marker.
+    
+    Equivalent to re.split(f'(?m)^{marker} ', content), but done in a single
+    linear pass over line starts so no regex backtracking is involved.
+    
+    Args:
+        content: Markdown content to split
+        marker: Header marker, e.g. '##' for H2
+        
+    Returns:
+        List of parts; the first is the content before the first header
+    """
+    prefix = marker + ' '
+    parts = []
+    start = 0
+    line_start = 0
+    
+    while line_start != -1:
+        if content.startswith(prefix, line_start):
+            parts.append(content[start:line_start])
+            start = line_start + len(prefix)
+        line_start = content.find('\n', line_start)
+        if line_start != -1:
+            line_start += 1
+    
+    parts.append(content[start:])
+    return parts
+
+
 def find_headers(content: str, header_level: int) -> List[Dict[str, Any]]:
     """
     Find all headers of specified level (e.g., ## for H2, ### for H3) in content.
@@ -65,10 +120,9 @@ def find_headers(content: str, header_level: int) -> List[Dict[str, Any]]:
         List of sections with title and content
     """
     marker = '#' * header_level
-    pattern = f'(?m)^{marker} '
     
     # Split content by headers of specified level
-    parts = re.split(pattern, content)
+    parts = split_at_headers(content, marker)
     
     sections = []
     
@@ -104,12 +158,12 @@ def find_headers(content: str, header_level: int) -> List[Dict[str, Any]]:
 def get_section_title_from_content(content: str) -> str:
     """Extract a title from content based on headers."""
     # Try to extract title from H2
-    h2_match = re.search(r'^## ([^\n]+)', content)
+    h2_match = _H2_TITLE_RE.search(content)
     if h2_match:
         return h2_match.group(1).strip()
     
     # Try to extract title from H3
-    h3_match = re.search(r'^### ([^\n]+)', content)
+    h3_match = _H3_TITLE_RE.search(content)
     if h3_match:
         return h3_match.group(1).strip()
     
@@ -119,7 +173,7 @@ def get_section_title_from_content(content: str) -> str:
 
 def count_paragraphs(content: str) -> int:
     """Count paragraphs that actually have content."""
-    paragraphs = re.split(r'\n\s*\n', content)
+    paragraphs = _PARAGRAPH_SPLIT_RE.split(content)
     return sum(1 for p in paragraphs if p.strip())
 
 
@@ -144,7 +198,7 @@ def build_chunk_key(base_path: str, section_path: List[str]) -> str:
     cleaned_sections = []
     for section in used_sections:
         # Remove non-word characters and replace spaces with hyphens
-        clean = re.sub(r'[^\w\s-]', '', section).strip().lower().replace(' ', '-')
+        clean = _KEY_CLEAN_RE.sub('', section).strip().lower().replace(' ', '-')
         if clean:
             cleaned_sections.append(clean)
     
@@ -167,7 +221,7 @@ def split_by_natural_breaks(content: str, target_size: int) -> List[str]:
         List of content chunks
     """
     # First try to split by paragraphs
-    paragraphs = re.split(r'\n\s*\n', content)
+    paragraphs = _PARAGRAPH_SPLIT_RE.split(content)
     paragraphs = [p for p in paragraphs if p.strip()]
     
     # If we have multiple paragraphs, use them for chunking
@@ -181,7 +235,7 @@ def split_by_natural_breaks(content: str, target_size: int) -> List[str]:
         return group_elements_by_size(lines, target_size, separator="\n")
     
     # If we still have very long content, split by sentences
-    sentences = re.split(r'(?<=[.!?])\s+', content)
+    sentences = _SENTENCE_SPLIT_RE.split(content)
     sentences = [s for s in sentences if s.strip()]
     if len(sentences) > 1:
         return group_elements_by_size(sentences, target_size, separator=" ")
@@ -313,7 +367,8 @@ def group_elements_by_size(elements: List[str], target_size: int, separator: str
 def process_markdown_document(
     content: str,
     file_path: str,
-    target_size: int = 5000
+    target_size: int = 5000,
+    docs_dir: Optional[Path] = None
 ) -> List[Dict[str, Any]]:
     """
     Process a markdown document, extracting frontmatter and chunking content.
@@ -322,6 +377,7 @@ def process_markdown_document(
         content: Markdown content to process
         file_path: Path to the markdown file
         target_size: Target size for chunks
+        docs_dir: Docs root used to build chunk keys (defaults to get_docs_dir())
         
     Returns:
         List of chunks with metadata
@@ -333,20 +389,19 @@ def process_markdown_document(
     if 'title' in frontmatter:
         document_title = frontmatter['title']
     else:
-        h1_match = re.search(r'# (.+?)(\n|$)', content_without_frontmatter)
+        h1_match = _H1_RE.search(content_without_frontmatter)
         if h1_match:
             document_title = h1_match.group(1).strip()
         else:
             document_title = Path(file_path).stem.replace('-', ' ').title()
     
     # Get normalized path for chunk keys
-    docs_dir = get_docs_dir()
+    if docs_dir is None:
+        docs_dir = get_docs_dir()
     try:
-        rel_path = Path(file_path).relative_to(docs_dir)
-        path = str(rel_path)
-        normalized_path = path.replace('/', '-').replace('\\', '-').replace('.md', '')
+        rel_path = str(Path(file_path).relative_to(docs_dir))
+        normalized_path = rel_path.replace('/', '-').replace('\\', '-').replace('.md', '')
     except ValueError:
-        path = str(file_path)
         normalized_path = Path(file_path).stem
     
     # Start the chunking process with the top-level document
@@ -632,13 +687,14 @@ def add_navigation_links(chunks: List[Dict[str, Any]]) -> None:
             chunk["metadata"]["next_chunk_key"] = chunks[i+1]["metadata"]["chunk_key"]
 
 
-def chunk_markdown_file(filepath: str, target_size: int = 5000) -> List[Dict[str, Any]]:
+def chunk_markdown_file(filepath: str, target_size: int = 5000, docs_dir: Optional[Path] = None) -> List[Dict[str, Any]]:
     """
     Process a markdown file, splitting it into chunks.
     
     Args:
         filepath: Path to the markdown file
         target_size: Target size for chunks in characters
+        docs_dir: Docs root used to build chunk keys (defaults to get_docs_dir())
         
     Returns:
         List of chunks with metadata
@@ -646,28 +702,127 @@ def chunk_markdown_file(filepath: str, target_size: int = 5000) -> List[Dict[str
     with open(filepath, 'r', encoding='utf-8') as f:
         content = f.read()
     
-    return process_markdown_document(content, str(filepath), target_size)
+    return process_markdown_document(content, str(filepath), target_size, docs_dir)
+
+
+def _chunk_file_for_pool(
+    filepath: str,
+    target_size: int,
+    docs_dir: Path
+) -> Tuple[str, List[Dict[str, Any]], Optional[str]]:
+    """
+    Chunk a single file inside a worker process.
+    
+    Exceptions are caught here and returned as a formatted traceback so that one
+    broken file does not abort the whole pool.
+    
+    Returns:
+        A tuple of (filepath, chunks, error_traceback_or_None)
+    """
+    try:
+        return filepath, chunk_markdown_file(filepath, target_size, docs_dir), None
+    except Exception:
+        import traceback
+        return filepath, [], traceback.format_exc()
+
+
+def _prefetch_files(filepaths: List[str], maxsize: int = 64):
+    """
+    Read files on a background thread so disk I/O overlaps with parsing.
+    
+    At most ``maxsize`` file contents are buffered ahead of the consumer. If the
+    consumer stops early (an exception, or the generator is closed), the reader
+    thread notices and exits instead of blocking on the full buffer.
+    
+    Yields:
+        Tuples of (filepath, content_or_None, error_traceback_or_None)
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        # Wait for room in the buffer, giving up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def reader():
+        for filepath in filepaths:
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    item = (filepath, f.read(), None)
+            except Exception:
+                import traceback
+                item = (filepath, None, traceback.format_exc())
+            if not put(item):
+                return
+        put(done)
+    
+    threading.Thread(target=reader, name="chunk-md-prefetch", daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def _chunk_files_serially(
+    filepaths: List[str],
+    target_size: int,
+    docs_dir: Path
+):
+    """
+    Chunk files in the current process, prefetching their contents on a thread.
+    
+    Yields:
+        Tuples of (filepath, chunks, error_traceback_or_None)
+    """
+    for filepath, content, error in _prefetch_files(filepaths):
+        if error is not None:
+            yield filepath, [], error
+            continue
+        try:
+            yield filepath, process_markdown_document(content, filepath, target_size, docs_dir), None
+        except Exception:
+            import traceback
+            yield filepath, [], traceback.format_exc()
 
 
-def process_directory(directory_path: str, target_size: int = 5000) -> List[Dict[str, Any]]:
+def process_directory(directory_path: str, target_size: int = 5000, workers: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Process all markdown files in a directory and its subdirectories.
     
+    Files are chunked in parallel with a process pool; results are collected in
+    the same order as the files are discovered. When running serially, file
+    contents are prefetched on a background thread while earlier files are parsed.
+    
     Args:
         directory_path: Path to the directory containing markdown files
         target_size: Target size for chunks in characters
+        workers: Number of worker processes (None uses os.cpu_count(), 1 runs serially)
         
     Returns:
         List of all chunks from all files
     """
     all_chunks = []
     
+    # Resolve the docs root once instead of once per file
+    docs_dir = get_docs_dir()
+    
     # Check if directory_path is a file
     if os.path.isfile(directory_path):
         if directory_path.endswith('.md'):
             try:
                 print(f"Processing file: {directory_path}")
-                chunks = chunk_markdown_file(directory_path, target_size)
+                chunks = chunk_markdown_file(directory_path, target_size, docs_dir)
                 all_chunks.extend(chunks)
                 print(f"Processed {directory_path}: {len(chunks)} chunks extracted")
             except Exception as e:
@@ -676,23 +831,41 @@ def process_directory(directory_path: str, target_size: int = 5000) -> List[Dict
                 traceback.print_exc()
         return all_chunks
     
-    # Process directory
+    # Collect all markdown files first so they can be distributed across workers
+    filepaths = []
     for root, _, files in os.walk(directory_path):
         for file in files:
             if file.endswith('.md'):
-                filepath = os.path.join(root, file)
-                try:
-                    chunks = chunk_markdown_file(filepath, target_size)
-                    all_chunks.extend(chunks)
-                    print(f"Processed {filepath}: {len(chunks)} chunks extracted")
-                except Exception as e:
-                    print(f"Error processing {filepath}: {e}")
-                    import traceback
-                    traceback.print_exc()
+                filepaths.append(os.path.join(root, file))
+    
+    if workers == 1 or len(filepaths) <= 1:
+        for filepath, chunks, error in _chunk_files_serially(filepaths, target_size, docs_dir):
+            _collect_file_result(all_chunks, filepath, chunks, error)
+    else:
+        worker = partial(_chunk_file_for_pool, target_size=target_size, docs_dir=docs_dir)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for filepath, chunks, error in executor.map(worker, filepaths, chunksize=32):
+                _collect_file_result(all_chunks, filepath, chunks, error)
     
     return all_chunks
 
 
+def _collect_file_result(
+    all_chunks: List[Dict[str, Any]],
+    filepath: str,
+    chunks: List[Dict[str, Any]],
+    error: Optional[str]
+) -> None:
+    """Append the chunks of one processed file and report its outcome."""
+    if error is not None:
+        print(f"Error processing {filepath}:")
+        print(error)
+        return
+    
+    all_chunks.extend(chunks)
+    print(f"Processed {filepath}: {len(chunks)} chunks extracted")
+
+
 def save_chunks_to_pickle(chunks: List[Dict[str, Any]], output_file: str) -> None:
     """
     Save chunks to a pickle file for later use.
@@ -701,8 +874,10 @@ def save_chunks_to_pickle(chunks: List[Dict[str, Any]], output_file: str) -> Non
         chunks: List of document chunks to save
         output_file: Path to the output pickle file
     """
+    import pickle
+    
     with open(output_file, 'wb') as f:
-        pickle.dump(chunks, f)
+        pickle.dump(chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
     print(f"Saved {len(chunks)} chunks to {output_file}")
 
 
@@ -733,6 +908,8 @@ def main():
                         help='Show preview of the first few chunks')
     parser.add_argument('--page-size', type=int, default=5000,
                         help='Target page size in characters (default: 5000)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs, 1 disables parallelism)')
     
     args = parser.parse_args()
     
@@ -741,7 +918,7 @@ def main():
         exit(1)
         
     # Process the directory and get all chunks
-    chunks = process_directory(args.dir, args.page_size)
+    chunks = process_directory(args.dir, args.page_size, args.workers)
     
     print(f"\nTotal chunks extracted: {len(chunks)}")
     
@@ -43,7 +43,7 @@ from src.clickhouse_mcp.docs_search import (
     simple_search,
     get_default_pickle_path
 )
-from src.clickhouse_mcp.vector_search import create_faiss_index, get_default_index_path
+from src.clickhouse_mcp.vector_search import EMBED_WORKERS, create_faiss_index, get_default_index_path
 from src.clickhouse_mcp import DEFAULT_BEDROCK_MODEL, DEFAULT_REGION
 
 
@@ -131,6 +131,8 @@ def main():
     
     # Import required packages for vector embeddings
     try:
+        import boto3
+        from botocore.config import Config
         from langchain_aws import BedrockEmbeddings
     except ImportError:
         print("Required packages not found. Install with:")
@@ -139,7 +141,14 @@ def main():
     
     # Initialize Bedrock Embeddings
     try:
+        # Chunks are embedded concurrently, so allow a connection per worker
+        client = boto3.client(
+            "bedrock-runtime",
+            region_name=args.region,
+            config=Config(max_pool_connections=EMBED_WORKERS)
+        )
         embeddings = BedrockEmbeddings(
+            client=client,
             region_name=args.region,
             model_id=args.model
         )